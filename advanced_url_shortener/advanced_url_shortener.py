@@ -1,4 +1,4 @@
-from flask import Flask, request, redirect
+from flask import Flask, request, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import string
@@ -81,7 +81,7 @@ def home():
                 db.session.add(new_url)
                 db.session.commit()
             
-            shortened_url = request.host_url + short_code
+            shortened_url = request.url_root + short_code
     
     # Advanced HTML with Copy Button
     html = f"""
@@ -201,7 +201,7 @@ def home():
             
             {f'<div class="error">{error}</div>' if error else ''}
             
-            <form method="POST" action="/">
+            <form method="POST" action="{url_for('home')}">
                 <input type="text" name="url" placeholder="Enter URL (e.g., https://example.com)" required>
                 <button type="submit">Shorten URL</button>
             </form>
@@ -216,7 +216,7 @@ def home():
             </div>''' if shortened_url else ''}
             
             <nav>
-                <a href="/history">View History</a>
+                <a href="{url_for('history')}">View History</a>
             </nav>
         </div>
         
@@ -337,7 +337,7 @@ def history():
     <body>
         <div class="container">
             <nav>
-                <a href="/">Home</a>
+                <a href="{url_for('home')}">Home</a>
             </nav>
             
             <h1>URL History <span class="badge">Advanced</span></h1>
@@ -363,7 +363,7 @@ def history():
                     <tr>
                         <td>{i}</td>
                         <td style="max-width: 300px; overflow: hidden; text-overflow: ellipsis;">{url.original_url}</td>
-                        <td><a href="/{url.short_code}" target="_blank">{request.host_url}{url.short_code}</a></td>
+                        <td><a href="{url_for('redirect_to_url', short_code=url.short_code)}" target="_blank">{request.url_root}{url.short_code}</a></td>
                         <td>{url.clicks}</td>
                         <td>{url.created_at.strftime('%Y-%m-%d %H:%M')}</td>
                     </tr>
@@ -373,10 +373,10 @@ def history():
             </table>
         """
     else:
-        html += """
+        html += f"""
             <div class="empty">
                 <h3>No URLs yet</h3>
-                <p><a href="/">Shorten your first URL</a></p>
+                <p><a href="{url_for('home')}">Shorten your first URL</a></p>
             </div>
         """
     
@@ -0,0 +1,231 @@
+"""
+Every app in one WSGI process, each mounted under its own path prefix.
+
+    /notes        notes_taker.py
+    /regex        regex_matcher_from_stirng/
+    /shortener    url_shortner/
+    /advanced     advanced_url_shortener/
+    /name         name_from_url/
+
+One interpreter and one copy of Flask and its dependencies serve all five,
+instead of one each. The apps share the request instrumentation here (see
+/_stats), opt-in request profiling (request_profiler.py, see /_profiles)
+and one thread pool (app.extensions['thread_pool']).
+
+Run it under a server that imports the app before forking its workers, so
+they share the imported code and data copy-on-write. Use an async worker:
+every open /notes/ page keeps a live feed stream open, and with sync or
+threaded workers each one holds a thread, so a few dozen idle tabs would
+leave no thread for any of the five apps. combined_gevent.py loads the app
+for gunicorn's gevent worker, where a stream only holds a greenlet:
+
+    gunicorn --preload -k gevent -w 4 --worker-connections 2000 combined_gevent:application
+
+With threaded workers, keep the live feed to a fraction of the threads
+(FLASK_NOTES_STREAM_MAX_CLIENTS, further clients get a 503 and retry):
+
+    FLASK_NOTES_STREAM_MAX_CLIENTS=4 gunicorn --preload -w 4 --threads 16 combined_app:application
+
+For development, run_combined.py starts werkzeug's server. Don't run this
+module directly: the regex app's spawned workers would import it again.
+
+Worker processes, threads and open files are all created lazily or
+reopened after a fork, so nothing is shared between workers by accident.
+memory_report.py compares the memory used with running the apps separately.
+"""
+import gc
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask, abort, jsonify, request, send_file, url_for
+from markupsafe import escape
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
+from werkzeug.wsgi import ClosingIterator
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# The apps import their helper modules by top-level name from their own directory
+for directory in ('regex_matcher_from_stirng', 'url_shortner', 'advanced_url_shortener', 'name_from_url'):
+    path = os.path.join(ROOT, directory)
+    if path not in sys.path:
+        sys.path.append(path)
+
+import advanced_url_shortener  # noqa: E402
+import name_from_url  # noqa: E402
+import notes_taker  # noqa: E402
+import regex_matcher_from_stirng  # noqa: E402
+import url_shortener  # noqa: E402
+from request_profiler import RequestProfiler  # noqa: E402
+
+MOUNTS = {
+    '/notes': ('Notes', notes_taker.app),
+    '/regex': ('Regex matcher', regex_matcher_from_stirng.app),
+    '/shortener': ('URL shortener', url_shortener.app),
+    '/advanced': ('URL shortener (advanced)', advanced_url_shortener.app),
+    '/name': ('Uppercase name converter', name_from_url.app),
+}
+
+# Threads for work an app fans out while handling a request
+SHARED_THREADS = int(os.environ.get('COMBINED_THREADS', 2 * (os.cpu_count() or 2)))
+thread_pool = ThreadPoolExecutor(max_workers=SHARED_THREADS, thread_name_prefix='shared')
+for _, mounted in MOUNTS.values():
+    mounted.extensions['thread_pool'] = thread_pool
+
+# The shorteners opened a database connection creating their tables, close it
+# so forked workers don't inherit (and share) it
+for module in (url_shortener, advanced_url_shortener):
+    with module.app.app_context():
+        module.db.engine.dispose()
+
+
+class RequestStats:
+    """
+    Request counters and timings per mounted app, shared by all of them.
+    A request is timed until its response is closed, so streamed responses
+    count their whole duration.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._apps = {}
+
+    def wrap(self, name, wsgi_app):
+        stats = self._apps[name] = {
+            'requests': 0, 'errors': 0, 'in_flight': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+        }
+
+        def instrumented(environ, start_response):
+            started = time.perf_counter()
+            status = []
+
+            def recording_start_response(status_line, headers, exc_info=None):
+                status.append(status_line)
+                return start_response(status_line, headers, exc_info)
+
+            def done():
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    stats['in_flight'] -= 1
+                    stats['requests'] += 1
+                    stats['errors'] += not status or status[0].startswith('5')
+                    stats['total_seconds'] += elapsed
+                    stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+
+            with self._lock:
+                stats['in_flight'] += 1
+            try:
+                response = wsgi_app(environ, recording_start_response)
+            except BaseException:
+                done()
+                raise
+            return ClosingIterator(response, done)
+
+        return instrumented
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'in_flight': stats['in_flight'],
+                    'avg_ms': round(stats['total_seconds'] / stats['requests'] * 1000, 2)
+                    if stats['requests'] else 0.0,
+                    'max_ms': round(stats['max_seconds'] * 1000, 2),
+                }
+                for name, stats in self._apps.items()
+            }
+
+
+request_stats = RequestStats()
+
+# Opt-in per-request profiling (PROFILE_REQUESTS=1), not installed at all otherwise
+profiler = RequestProfiler.from_environ()
+
+
+def _instrumented(name, wsgi_app):
+    if profiler is not None:
+        wsgi_app = profiler.wrap(name, wsgi_app)
+    return request_stats.wrap(name, wsgi_app)
+
+# The root app: a page linking to the others, and the shared stats
+root = Flask(__name__)
+
+
+@root.route('/')
+def index():
+    links = ''.join(f'<li><a href="{request.script_root}{prefix}/">{escape(title)}</a></li>'
+                    for prefix, (title, _) in MOUNTS.items())
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head><title>Flask Tasks</title></head>
+    <body style="font-family: Arial, sans-serif; max-width: 600px; margin: 50px auto;">
+        <h1>Flask Tasks</h1>
+        <ul>{links}</ul>
+        <p><a href="{request.script_root}/_stats">Request stats</a></p>
+    </body>
+    </html>
+    """
+
+
+def _memory():
+    """This process' resident memory, from /proc where there is one"""
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f)
+    except OSError:
+        return {}
+    return {key.lower() + '_kb': int(fields[key].split()[0]) for key in ('VmRSS', 'RssAnon', 'RssFile')
+            if key in fields}
+
+
+@root.route('/_stats')
+def stats():
+    return jsonify({
+        'pid': os.getpid(),
+        'apps': request_stats.snapshot(),
+        'memory': _memory(),
+        'thread_pool_size': SHARED_THREADS,
+        'profiler': profiler.stats() if profiler is not None else None,
+    })
+
+
+if profiler is not None:
+    @root.route('/_profiles')
+    def profiles():
+        """The slowest recently profiled requests, needs an X-Profile-Token"""
+        if not profiler.authorized(request.headers.get('X-Profile-Token')):
+            abort(403)
+        return jsonify({
+            'stats': profiler.stats(),
+            'profiles': [
+                dict(profile, files={kind: url_for('profile_file', profile_id=profile['id'], kind=kind)
+                                     for kind in profile['files']})
+                for profile in profiler.profiles()
+            ],
+        })
+
+    @root.route('/_profiles/<profile_id>/<kind>')
+    def profile_file(profile_id, kind):
+        """A profile's collapsed stacks ('stacks', 'memory') or cProfile dump ('pstats')"""
+        if not profiler.authorized(request.headers.get('X-Profile-Token')):
+            abort(403)
+        path = profiler.path(profile_id, kind)
+        if path is None or not os.path.exists(path):
+            abort(404)
+        return send_file(path, mimetype='application/octet-stream' if kind == 'pstats' else 'text/plain',
+                         as_attachment=True, download_name=os.path.basename(path))
+
+
+# The root app isn't profiled: its admin pages carry the profiling token too
+application = DispatcherMiddleware(
+    request_stats.wrap('root', root),
+    {prefix: _instrumented(prefix[1:], mounted) for prefix, (_, mounted) in MOUNTS.items()},
+)
+
+# Everything imported so far lives as long as the process: keep the garbage
+# collector from touching it, which would copy its pages into every worker
+gc.freeze()
@@ -0,0 +1,18 @@
+"""
+combined_app for gunicorn's gevent worker:
+
+    pip install gunicorn gevent
+    gunicorn --preload -k gevent -w 4 --worker-connections 2000 combined_gevent:application
+
+gevent patches threading, socket, time.sleep and friends so that waiting
+(like an idle live feed client in /notes/api/notes/stream) only holds a
+greenlet instead of an OS thread. The patching has to happen before
+combined_app imports anything: with --preload the apps are imported in the
+master, before gunicorn's worker would patch, and locks or threads created
+unpatched would block the whole worker.
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+from combined_app import application  # noqa: E402,F401
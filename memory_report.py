@@ -0,0 +1,158 @@
+"""
+Memory used by the five apps run separately vs mounted together (combined_app.py).
+
+Each setup is started in fresh processes, warmed with a few requests, and
+measured from /proc/<pid>/smaps_rollup (Linux):
+- RSS: resident memory, counting shared pages in full in every process
+- PSS: shared pages split between the processes sharing them, so PSS adds
+  up to what the processes really cost together
+- private: pages only that process uses
+
+Usage: python memory_report.py [--workers 4]
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# module, directory it runs from, URLs requested to warm it up
+APPS = [
+    ('notes_taker', '.', ['/', '/api/notes', '/search?q=note']),
+    ('regex_matcher_from_stirng', 'regex_matcher_from_stirng', ['/', '/stats']),
+    ('url_shortener', 'url_shortner', ['/', '/history']),
+    ('advanced_url_shortener', 'advanced_url_shortener', ['/', '/history']),
+    ('name_from_url', 'name_from_url', ['/', '/?name=hamza']),
+]
+COMBINED_URLS = {'notes_taker': '/notes', 'regex_matcher_from_stirng': '/regex',
+                 'url_shortener': '/shortener', 'advanced_url_shortener': '/advanced',
+                 'name_from_url': '/name'}
+
+
+def smaps(pid='self'):
+    """RSS, PSS and private memory of a process, in KB"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            key, _, rest = line.partition(':')
+            if rest.strip().endswith('kB'):
+                values[key] = int(rest.split()[0])
+    return {
+        'rss': values.get('Rss', 0),
+        'pss': values.get('Pss', 0),
+        'private': values.get('Private_Clean', 0) + values.get('Private_Dirty', 0),
+    }
+
+
+def _warm(wsgi_app, urls):
+    from werkzeug.test import Client
+    client = Client(wsgi_app)
+    for url in urls:
+        client.get(url).close()
+
+
+def _combined_urls():
+    return [COMBINED_URLS[module] + url for module, _, urls in APPS for url in urls]
+
+
+def child_separate(module):
+    """Import and warm up one app, print its memory"""
+    directory, urls = next((d, u) for m, d, u in APPS if m == module)
+    sys.path.insert(0, os.path.join(ROOT, directory))
+    app = __import__(module).app
+    _warm(app, urls)
+    print(json.dumps([smaps()]))
+
+
+def child_combined(workers):
+    """
+    Import the combined app, then (with `workers`) fork workers off it like
+    a preloading server does and measure them all
+    """
+    sys.path.insert(0, ROOT)
+    import combined_app
+    if not workers:
+        _warm(combined_app.application, _combined_urls())
+        print(json.dumps([smaps()]))
+        return
+    pids = []
+    ready_read, ready_write = os.pipe()
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            _warm(combined_app.application, _combined_urls())
+            os.write(ready_write, b'.')
+            signal.pause()
+            os._exit(0)
+        pids.append(pid)
+    for _ in range(workers):
+        os.read(ready_read, 1)
+    try:
+        print(json.dumps([smaps()] + [smaps(pid) for pid in pids]))
+    finally:
+        for pid in pids:
+            os.kill(pid, signal.SIGTERM)
+            os.waitpid(pid, 0)
+
+
+def _run(*args):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), *args], check=True,
+                            capture_output=True, text=True, cwd=ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _total(measures):
+    return {key: sum(m[key] for m in measures) for key in ('rss', 'pss', 'private')}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--combined', type=int, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child_separate(args.child)
+    if args.combined is not None:
+        return child_combined(args.combined)
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        sys.exit('memory_report.py needs Linux (/proc/<pid>/smaps_rollup)')
+
+    # Keep the notes written while warming up out of the real store
+    os.environ.setdefault('FLASK_NOTES_DIR', tempfile.mkdtemp(prefix='memory-report-'))
+
+    separate = {module: _run('--child', module)[0] for module, _, _ in APPS}
+    combined = _run('--combined', '0')
+    preloaded = _run('--combined', str(args.workers))
+
+    def row(label, processes, memory):
+        print(f'{label:44} {processes:>9} {memory["rss"] / 1024:9.1f} {memory["pss"] / 1024:9.1f}'
+              f' {memory["private"] / 1024:10.1f}')
+
+    print(f'{"":44} {"processes":>9} {"RSS MB":>9} {"PSS MB":>9} {"private MB":>10}')
+    for module, memory in separate.items():
+        row(f'  {module}', 1, memory)
+    separate_total = _total(separate.values())
+    row('separate apps, one process each', len(separate), separate_total)
+    row('combined, one process', 1, combined[0])
+    row(f'separate apps, {args.workers} workers each (estimate)', len(separate) * args.workers,
+        {key: value * args.workers for key, value in separate_total.items()})
+    row(f'combined --preload, master + {args.workers} workers', len(preloaded), _total(preloaded))
+    row('  each preloaded worker (average)', 1,
+        {key: value / args.workers for key, value in _total(preloaded[1:]).items()})
+
+    saved = separate_total['pss'] - combined[0]['pss']
+    saved_workers = separate_total['pss'] * args.workers - _total(preloaded)['pss']
+    print()
+    print(f'saved by one combined process:      {saved / 1024:7.1f} MB PSS'
+          f' ({saved / separate_total["pss"]:.0%})')
+    print(f'saved with {args.workers} preloaded workers:      {saved_workers / 1024:7.1f} MB PSS'
+          f' ({saved_workers / (separate_total["pss"] * args.workers):.0%})')
+
+
+if __name__ == '__main__':
+    main()
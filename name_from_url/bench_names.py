@@ -0,0 +1,91 @@
+"""
+Benchmark: names transformed per second, one ?name= request each vs batches.
+
+Names are drawn from a skewed vocabulary (a few names are very common, like
+real traffic), so the memo cache hit rate is reported too. Requests go
+through Flask's test client, which measures the app without network cost.
+
+Usage: python bench_names.py [--names 20000] [--vocabulary 5000] [--batch 1000] [--repeat 3]
+"""
+import argparse
+import json
+import random
+import string
+import time
+
+from name_from_url import app, transform
+
+# Some non-ASCII names, whose case mappings aren't one-to-one
+SPECIAL = ['straße', 'İlkay', 'ǆemal', 'ﬁona', 'σοφία', 'Ærøskøbing', 'łukasz']
+
+
+def make_names(count, vocabulary, rng):
+    words = SPECIAL + [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+                       for _ in range(vocabulary - len(SPECIAL))]
+    # Zipf-like weights: the k-th most common name is k times rarer than the first
+    weights = [1 / (k + 1) for k in range(len(words))]
+    return rng.choices(words, weights, k=count)
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        transform.cache_clear()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--names', type=int, default=20000)
+    parser.add_argument('--vocabulary', type=int, default=5000)
+    parser.add_argument('--batch', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    names = make_names(args.names, args.vocabulary, rng)
+    batches = [names[i:i + args.batch] for i in range(0, len(names), args.batch)]
+    ndjson_bodies = [''.join(json.dumps(name) + '\n' for name in chunk) for chunk in batches]
+    client = app.test_client()
+
+    def single():
+        for name in names:
+            client.get('/', query_string={'name': name})
+
+    def batch_json():
+        for chunk in batches:
+            client.post('/batch', json={'names': chunk})
+
+    def batch_ndjson():
+        for body in ndjson_bodies:
+            client.post('/batch', data=body, content_type='application/x-ndjson').get_data()
+
+    def uncached():
+        # The transform alone without the memo, for comparison
+        for chunk in batches:
+            ', '.join([json.dumps(name.strip().upper(), ensure_ascii=False) for name in chunk])
+
+    def cached():
+        for chunk in batches:
+            ', '.join([transform('upper', name) for name in chunk])
+
+    print(f'{len(names)} names, {len(set(names))} distinct, batches of {args.batch}')
+    print(f'{"":24} {"seconds":>9} {"names/s":>12}')
+    single_time = None
+    for label, fn in [('single requests', single), ('batch (JSON)', batch_json),
+                      ('batch (NDJSON)', batch_ndjson), ('transform, no memo', uncached),
+                      ('transform, memoized', cached)]:
+        seconds = best_of(args.repeat, fn)
+        single_time = single_time or seconds
+        print(f'{label:24} {seconds:9.3f} {len(names) / seconds:12,.0f}'
+              f'   {single_time / seconds:6.1f}x')
+    info = transform.cache_info()
+    print(f'memo hit rate on the last run: {info.hits / (info.hits + info.misses):.1%}'
+          f' ({info.currsize} entries)')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,30 @@
-from flask import Flask, request
+import hashlib
+import json
+import re
+from functools import lru_cache
 
-app = Flask(__name__)
+from flask import Flask, Response, jsonify, request, stream_with_context, url_for
+from markupsafe import escape
 
-@app.route('/')
-def home():
-    """
-    Home page:
-    - Reads 'name' from the URL query
-    - Shows instructions if no name is provided
-    - Displays the name in UPPERCASE if provided
-    """
+app = Flask(__name__)
+app.config['NAME_CACHE_SIZE'] = 65536        # transformed names memoized (least recently used dropped)
+app.config['NAME_MAX_LENGTH'] = 1000         # longest name accepted (characters)
+app.config['NAME_BATCH_MAX_NAMES'] = 100_000  # names per JSON batch request
+app.config['NAME_BATCH_MAX_CHARS'] = 10_000_000  # characters in all the names of a JSON batch request
+app.config['NAME_BATCH_CHUNK'] = 1000        # NDJSON lines transformed and sent at a time
+app.config['NAME_PAGE_MAX_AGE'] = 86400      # seconds browsers may cache the instructions page
+# Allow overrides such as FLASK_NAME_CACHE_SIZE=1000000 from the environment
+app.config.from_prefixed_env()
 
-    name = request.args.get('name', '').strip()
+# Full Unicode case mappings: "straße" upper is "STRASSE", casefold gives
+# "strasse" for caseless comparisons
+MODES = {
+    'upper': str.upper,
+    'casefold': str.casefold,
+}
 
-    if not name:
-        return """
+# The instructions page never changes, so it's rendered once
+INSTRUCTIONS_PAGE = """
         <!DOCTYPE html>
         <html>
         <head>
@@ -53,25 +63,26 @@ def home():
             </div>
         </body>
         </html>
-        """
-    
-    uppercase_name = name.upper()
+        """.encode('utf-8')
+INSTRUCTIONS_ETAG = hashlib.sha256(INSTRUCTIONS_PAGE).hexdigest()[:16]
 
-    return f"""
+# The result page around the name and home link, split once so a request only
+# joins a few strings
+RESULT_PAGE_HEAD, RESULT_PAGE_MIDDLE, RESULT_PAGE_TAIL = re.split(r'\{name\}|\{home\}', """
     <!DOCTYPE html>
     <html>
     <head>
         <title>Your Name in Uppercase</title>
         <style>
-            body {{
+            body {
                 font-family: Arial, sans-serif;
                 max-width: 600px;
                 margin: 50px auto;
                 padding: 20px;
                 text-align: center;
-            }}
-            h1 {{ color: #333; }}
-            .result {{
+            }
+            h1 { color: #333; }
+            .result {
                 background: #4CAF50;
                 color: white;
                 padding: 30px;
@@ -80,8 +91,8 @@ def home():
                 font-size: 2em;
                 font-weight: bold;
                 letter-spacing: 3px;
-            }}
-            a {{
+            }
+            a {
                 display: inline-block;
                 margin-top: 20px;
                 padding: 10px 22px;
@@ -89,17 +100,149 @@ def home():
                 color: white;
                 text-decoration: none;
                 border-radius: 5px;
-            }}
-            a:hover {{ background: #555; }}
+            }
+            a:hover { background: #555; }
         </style>
     </head>
     <body>
         <h1>Your Name in Uppercase 🎉</h1>
-        <div class="result">{uppercase_name}</div>
-        <a href="/">Try another name</a>
+        <div class="result">{name}</div>
+        <a href="{home}">Try another name</a>
     </body>
     </html>
+    """)
+
+
+@lru_cache(maxsize=app.config['NAME_CACHE_SIZE'])
+def transform(mode, name):
+    """
+    `name` stripped and transformed by `mode`, as JSON text.
+    Memoized: the same names come up again and again, and a hit skips both
+    the case mapping and the JSON encoding.
+    """
+    return json.dumps(MODES[mode](name.strip()), ensure_ascii=False)
+
+
+@app.route('/')
+def home():
+    """
+    Home page:
+    - Reads 'name' from the URL query
+    - Shows instructions if no name is provided
+    - Displays the name in UPPERCASE if provided
+    """
+
+    name = request.args.get('name', '').strip()
+
+    if not name:
+        response = Response(INSTRUCTIONS_PAGE, mimetype='text/html')
+        response.set_etag(INSTRUCTIONS_ETAG)
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['NAME_PAGE_MAX_AGE']
+        return response.make_conditional(request)
+
+    uppercase_name = name.upper()
+
+    return RESULT_PAGE_HEAD + str(escape(uppercase_name)) + RESULT_PAGE_MIDDLE + url_for('home') + RESULT_PAGE_TAIL
+
+@app.route('/batch', methods=['POST'])
+def batch():
     """
+    Transform many names in one request, ?mode=upper (default) or casefold.
+    - JSON: {"names": [...], "mode": "upper"} -> {"mode": ..., "results": [...]}
+    - NDJSON (Content-Type: application/x-ndjson): one JSON string per line
+      in, one per line out in the same order, streamed back in chunks of
+      NAME_BATCH_CHUNK lines. Lines that aren't a string (or are too long)
+      come back as null.
+    Names are stripped like ?name= is.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        mode = request.args.get('mode', 'upper')
+        if mode not in MODES:
+            return jsonify({'error': f'"mode" must be one of {", ".join(MODES)}'}), 400
+        return Response(stream_with_context(_transform_lines(mode, request.stream)),
+                        mimetype='application/x-ndjson')
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    mode = data.get('mode', request.args.get('mode', 'upper'))
+    names = data.get('names')
+    if not isinstance(mode, str) or mode not in MODES:
+        return jsonify({'error': f'"mode" must be one of {", ".join(MODES)}'}), 400
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        return jsonify({'error': '"names" must be a list of strings'}), 400
+    if len(names) > app.config['NAME_BATCH_MAX_NAMES']:
+        return jsonify({'error': f"Too many names (max {app.config['NAME_BATCH_MAX_NAMES']})"}), 400
+    max_length = app.config['NAME_MAX_LENGTH']
+    if any(len(name) > max_length for name in names):
+        return jsonify({'error': f'Names are limited to {max_length} characters'}), 400
+    if sum(map(len, names)) > app.config['NAME_BATCH_MAX_CHARS']:
+        return jsonify({'error': f"Names are too long in total (max {app.config['NAME_BATCH_MAX_CHARS']} characters)"}), 400
+
+    # The results are already JSON text, so the response is assembled
+    # rather than encoded again
+    results = ', '.join([transform(mode, name) for name in names])
+    return Response(f'{{"mode": "{mode}", "results": [{results}]}}\n', mimetype='application/json')
+
+def _transform_lines(mode, stream):
+    """Output NDJSON for the input lines of `stream`, a chunk at a time"""
+    max_length = app.config['NAME_MAX_LENGTH']
+    # Longest line a valid name can take: every character as a \uXXXX escape
+    max_line = max_length * 6 + 3
+    chunk_size = app.config['NAME_BATCH_CHUNK']
+    out = []
+    pending = b''     # start of a line continued in the next block
+    skipping = False  # in the middle of a line too long to be a name
+    while True:
+        # Reading blocks and splitting them is much faster than readline()
+        block = stream.read(1 << 16)
+        lines = (pending + block).split(b'\n')
+        # The last piece is incomplete, unless the input ended
+        pending = lines.pop() if block else b''
+        if skipping:
+            if not lines:
+                pending = b''
+                continue
+            # The end of the long line, already answered with null
+            del lines[0]
+            skipping = False
+        for line in lines:
+            if not line.strip():
+                # Blank lines are skipped, as NDJSON readers do
+                continue
+            try:
+                name = json.loads(line)
+            except ValueError:
+                name = None
+            if isinstance(name, str) and len(name) <= max_length:
+                out.append(transform(mode, name))
+            else:
+                out.append('null')
+            if len(out) >= chunk_size:
+                yield '\n'.join(out) + '\n'
+                out = []
+        if len(pending) > max_line:
+            out.append('null')
+            pending = b''
+            skipping = True
+        if not block:
+            break
+    if out:
+        yield '\n'.join(out) + '\n'
+
+@app.route('/stats')
+def stats():
+    """Memo cache counters"""
+    info = transform.cache_info()
+    lookups = info.hits + info.misses
+    return jsonify({
+        'entries': info.currsize,
+        'max_entries': info.maxsize,
+        'hits': info.hits,
+        'misses': info.misses,
+        'hit_rate': round(info.hits / lookups, 4) if lookups else 0.0,
+    })
 
 if __name__ == '__main__':
     print("🚀 Flask app is running...")
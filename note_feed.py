@@ -0,0 +1,107 @@
+"""
+Fan-out of new notes to Server-Sent Events clients.
+
+Each client gets a small bounded buffer of events. Publishing an event
+serializes it once, appends it to every buffer and wakes the clients; a
+client whose buffer fills up isn't reading fast enough and is dropped
+instead of letting its buffer grow (browsers reconnect on their own and
+resume with Last-Event-ID). An idle client costs its buffer and one
+waiting thread or greenlet, nothing is done for it until something is
+published or its keep-alive is due.
+"""
+import threading
+from collections import deque
+
+
+class Subscriber:
+    """One connected client: its pending events and whether it was dropped"""
+    __slots__ = ('events', 'ready', 'dropped')
+
+    def __init__(self):
+        self.events = deque()
+        self.ready = threading.Event()
+        self.dropped = False
+
+
+class Broadcaster:
+    """
+    Publish/subscribe hub for pre-serialized events.
+    - Each subscriber buffers at most `max_buffer` events, past that it's dropped
+    - At most `max_clients` subscribers at once, subscribe() returns None past that
+    """
+
+    def __init__(self, max_buffer=256, max_clients=10_000):
+        self.max_buffer = max_buffer
+        self.max_clients = max_clients
+        self._subscribers = set()
+        # Guards the subscriber set only: each client waits on its own event,
+        # so waking thousands of them doesn't pile them all on one lock
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def subscribe(self):
+        with self._lock:
+            if len(self._subscribers) >= self.max_clients:
+                self.rejected += 1
+                return None
+            subscriber = Subscriber()
+            self._subscribers.add(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, events):
+        """Queue `events` (already serialized) for every subscriber"""
+        if not events:
+            return
+        with self._lock:
+            self.published += len(events)
+            subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                if len(subscriber.events) + len(events) > self.max_buffer:
+                    subscriber.dropped = True
+                    subscriber.events.clear()
+                    self._subscribers.discard(subscriber)
+                    self.dropped += 1
+                else:
+                    subscriber.events.extend(events)
+        # Wake them outside the lock, woken clients may want to unsubscribe
+        for subscriber in subscribers:
+            subscriber.ready.set()
+
+    def wait(self, subscriber, timeout):
+        """
+        Events queued for `subscriber`, waiting up to `timeout` seconds for
+        some. Returns [] on timeout and None once the subscriber was dropped.
+        """
+        # Cleared before looking, so an event published from here on sets it again
+        subscriber.ready.clear()
+        if not subscriber.events and not subscriber.dropped:
+            subscriber.ready.wait(timeout)
+        if subscriber.dropped:
+            return None
+        # Only this client pops and deque operations are atomic, no lock needed
+        events = []
+        queue = subscriber.events
+        while queue:
+            events.append(queue.popleft())
+        return events
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'clients': len(self._subscribers),
+                'max_clients': self.max_clients,
+                'max_buffer': self.max_buffer,
+                'buffered_events': sum(len(s.events) for s in self._subscribers),
+                'published': self.published,
+                'dropped': self.dropped,
+                'rejected': self.rejected,
+            }
@@ -0,0 +1,222 @@
+"""
+In-memory inverted index over notes, for ranked full-text search.
+
+Each term maps to a posting list kept as two compact int arrays: the ids of
+the notes containing it (sorted, since notes are indexed in id order) and how
+many times it occurs in each. New notes are appended to the lists as they
+are added, nothing is rebuilt.
+
+Queries match notes containing every term (a term ending in * matches any
+term with that prefix) and are ranked with BM25. Candidates come from the
+rarest term and are checked against the other lists by binary search, so a
+query costs about the size of its rarest posting list, capped at the most
+recent `max_candidates` postings.
+"""
+import bisect
+import heapq
+import math
+import re
+import sys
+import threading
+from array import array
+
+_TOKEN = re.compile(r'\w+')
+_QUERY_TERM = re.compile(r'(\w+)(\*?)')
+
+# Most terms a prefix like "foo*" expands to (the most common ones are kept)
+MAX_EXPANSIONS = 50
+# Largest term frequency stored per posting
+_MAX_TF = 0xFFFF
+
+
+def tokenize(text):
+    return _TOKEN.findall(text.casefold())
+
+
+class NoteIndex:
+    """Inverted index of notes by id, with BM25 ranking (k1, b)"""
+
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._term_ids = {}
+        self._sorted_terms = []    # for prefix lookups
+        self._new_terms = []       # added since _sorted_terms was last sorted
+        self._postings = []        # term id -> array of note ids
+        self._frequencies = []     # term id -> array of term counts, parallel to _postings
+        self._doc_lengths = array('I')
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_lengths)
+
+    def add(self, note_id, text):
+        """Index a note, ids must come in order (0, 1, 2, ...)"""
+        with self._lock:
+            self._add(note_id, text)
+
+    def _add(self, note_id, text):
+        if note_id != len(self._doc_lengths):
+            raise ValueError(f'expected note {len(self._doc_lengths)}, got {note_id}')
+        counts = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for term, count in counts.items():
+            term_id = self._term_ids.get(term)
+            if term_id is None:
+                term_id = self._term_ids[term] = len(self._postings)
+                self._postings.append(array('I'))
+                self._frequencies.append(array('H'))
+                self._new_terms.append(term)
+            self._postings[term_id].append(note_id)
+            self._frequencies[term_id].append(min(count, _MAX_TF))
+        self._doc_lengths.append(len(tokens))
+        self._total_length += len(tokens)
+
+    def update(self, store):
+        """Index the notes added to `store` since the last update"""
+        with self._lock:
+            version = store.version
+            start = len(self._doc_lengths)
+            # Fetch in batches so a first full build doesn't copy every note at once
+            for batch_start in range(start, version, 10_000):
+                batch_stop = min(version, batch_start + 10_000)
+                for offset, text in enumerate(store.notes(batch_start, batch_stop)):
+                    self._add(batch_start + offset, text)
+
+    def _expand(self, prefix):
+        """Term ids starting with `prefix`, most common first"""
+        if self._new_terms:
+            # Sorting two sorted runs is a linear merge
+            self._new_terms.sort()
+            self._sorted_terms += self._new_terms
+            self._sorted_terms.sort()
+            self._new_terms = []
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        term_ids = []
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            term_ids.append(self._term_ids[term])
+        return heapq.nlargest(MAX_EXPANSIONS, term_ids, key=lambda t: len(self._postings[t]))
+
+    def search(self, query, limit=20, max_candidates=20_000):
+        """
+        Best `limit` notes for `query` as [(note_id, score)], how many notes
+        matched, and whether older notes were left out: only the newest
+        `max_candidates` postings of the rarest term are ranked and counted.
+        """
+        with self._lock:
+            return self._search(query, limit, max_candidates)
+
+    def _search(self, query, limit, max_candidates):
+        # One group of term ids per query term, a prefix term has several
+        groups = []
+        for word, star in _QUERY_TERM.findall(query.casefold()):
+            if star:
+                term_ids = self._expand(word)
+            else:
+                term_id = self._term_ids.get(word)
+                term_ids = [] if term_id is None else [term_id]
+            if not term_ids:
+                return [], 0, False
+            groups.append(term_ids)
+        if not groups:
+            return [], 0, False
+
+        count = len(self._doc_lengths)
+        k1, b = self.k1, self.b
+        length_weight = b / (self._total_length / count)
+        doc_lengths = self._doc_lengths
+
+        def idf(term_id):
+            df = len(self._postings[term_id])
+            return math.log(1 + (count - df + 0.5) / (df + 0.5))
+
+        # Candidates from the rarest group, its newest postings only
+        groups.sort(key=lambda ids: sum(len(self._postings[t]) for t in ids))
+        cutoff = self._cutoff([self._postings[t] for t in groups[0]], max_candidates)
+        scores = {}
+        for term_id in groups[0]:
+            weight = idf(term_id) * (k1 + 1)
+            postings = self._postings[term_id]
+            start = bisect.bisect_left(postings, cutoff)
+            for note_id, tf in zip(postings[start:], self._frequencies[term_id][start:]):
+                # BM25 term score, a prefix group scores a note by its best term
+                score = weight * tf / (tf + k1 * (1 - b + length_weight * doc_lengths[note_id]))
+                if score > scores.get(note_id, 0.0):
+                    scores[note_id] = score
+
+        # Every other group must match too
+        for term_ids in groups[1:]:
+            low, high = min(scores), max(scores)
+            best = {}
+            for term_id in term_ids:
+                weight = idf(term_id) * (k1 + 1)
+                postings = self._postings[term_id]
+                frequencies = self._frequencies[term_id]
+                # Only the part of the list between the candidates' ids matters:
+                # walk it if it's short, else look candidates up in it by id
+                # with a dict (built in C) or by binary search
+                start = bisect.bisect_left(postings, low)
+                stop = bisect.bisect_right(postings, high, start)
+                if stop - start <= len(scores):
+                    hits = ((note_id, tf) for note_id, tf in zip(postings[start:stop], frequencies[start:stop])
+                            if note_id in scores)
+                elif stop - start <= 8 * len(scores):
+                    found = dict(zip(postings[start:stop], frequencies[start:stop]))
+                    hits = ((note_id, found[note_id]) for note_id in scores if note_id in found)
+                else:
+                    hits = []
+                    for note_id in scores:
+                        i = bisect.bisect_left(postings, note_id, start, stop)
+                        if i < stop and postings[i] == note_id:
+                            hits.append((note_id, frequencies[i]))
+                for note_id, tf in hits:
+                    score = weight * tf / (tf + k1 * (1 - b + length_weight * doc_lengths[note_id]))
+                    if score > best.get(note_id, 0.0):
+                        best[note_id] = score
+            scores = {note_id: scores[note_id] + score for note_id, score in best.items()}
+            if not scores:
+                return [], 0, False
+
+        # Best scores first, newer notes first among equal scores
+        best = heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], item[0]))
+        return best, len(scores), cutoff > 0
+
+    def _cutoff(self, lists, limit):
+        """Lowest note id from which the posting lists hold at most `limit` postings"""
+        low, high = 0, len(self._doc_lengths)
+        while low < high:
+            mid = (low + high) // 2
+            if sum(len(postings) - bisect.bisect_left(postings, mid) for postings in lists) <= limit:
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    def memory(self):
+        """Approximate memory used by the index, in bytes"""
+        with self._lock:
+            postings = sum(len(a) * a.itemsize for a in self._postings)
+            frequencies = sum(len(a) * a.itemsize for a in self._frequencies)
+            array_overhead = sum(sys.getsizeof(a) - len(a) * a.itemsize
+                                 for arrays in (self._postings, self._frequencies) for a in arrays)
+            terms = sum(sys.getsizeof(term) for term in self._term_ids)
+            dictionary = (sys.getsizeof(self._term_ids) + sys.getsizeof(self._sorted_terms)
+                          + sys.getsizeof(self._new_terms)
+                          + sys.getsizeof(self._postings) + sys.getsizeof(self._frequencies) + terms)
+            doc_lengths = sys.getsizeof(self._doc_lengths)
+            return {
+                'notes': len(self._doc_lengths),
+                'terms': len(self._term_ids),
+                'postings': sum(len(a) for a in self._postings),
+                'posting_bytes': postings,
+                'frequency_bytes': frequencies,
+                'array_overhead_bytes': array_overhead,
+                'dictionary_bytes': dictionary,
+                'doc_length_bytes': doc_lengths,
+                'total_bytes': postings + frequencies + array_overhead + dictionary + doc_lengths,
+            }
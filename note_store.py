@@ -0,0 +1,486 @@
+"""
+Persistent, append-only note store shared by every worker process on a host.
+
+Files in the store directory:
+- CURRENT: the generation in use
+- snapshot-<gen>.bin: every note from before log-<gen>, as an array of end
+  offsets followed by the UTF-8 text of all notes back to back
+- log-<gen>.bin: notes added since, one record each (length, crc32, text)
+- lock: flock'ed exclusively by writers, shared by readers opening files
+- compact.lock: flock'ed by the process compacting, so only one does at a time
+
+Writes from concurrent requests are group committed: one thread writes and
+fsyncs everything queued so far while the others wait for it. Once the log
+grows to a fraction of the snapshot's size, a background thread compacts
+them into the next generation's snapshot. The snapshot is written without
+any lock held, then the notes logged meanwhile are copied into the new log
+and the store switches generation, so writers only wait for that last step.
+Compacting at a fraction of the snapshot's size keeps the bytes rewritten
+proportional to the bytes added, however large the store grows.
+In memory, notes are kept the same way as in a snapshot (one bytearray of text
+plus an offsets array), so a snapshot loads with a couple of reads and
+millions of notes don't cost millions of Python objects.
+"""
+import fcntl
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+import weakref
+import zlib
+from array import array
+from contextlib import contextmanager
+
+SNAPSHOT_MAGIC = b'NOTESNAP1\n'
+# Snapshot header: magic, note count, text bytes, crc32 of offsets + text
+_SNAPSHOT_HEADER = struct.Struct('<10sQQI')
+# Log record header: text bytes, crc32 of the text
+_RECORD_HEADER = struct.Struct('<II')
+# Notes are copied out of memory this many bytes at a time while compacting
+_COPY_BLOCK = 1 << 20
+
+logger = logging.getLogger(__name__)
+
+
+class NoteStore:
+    """
+    Notes by id (0, 1, 2, ... in the order they were added).
+    Call refresh() before reading to pick up notes added by other processes.
+    """
+
+    def __init__(self, directory, fsync=True, compact_ratio=0.5, compact_min_bytes=1 << 20):
+        self.directory = directory
+        self.fsync = fsync
+        # Compact once the log holds compact_ratio times the snapshot's bytes
+        # (and at least compact_min_bytes)
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        os.makedirs(directory, exist_ok=True)
+
+        # In-memory copy of the notes
+        self._data = bytearray()
+        self._ends = array('Q')
+        self._lock = threading.Lock()      # guards the in-memory copy
+        self._io_lock = threading.Lock()   # one thread at a time touches the files
+        self._lock_fd = os.open(os.path.join(directory, 'lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        self._log_fd = None
+        self._stale = False  # the log may be an old generation's, reload via CURRENT
+        self._log_pos = 0
+        self._log_records = 0
+        self._snapshot_bytes = 0
+        self.generation = 0
+
+        # Background compaction
+        self._compact_lock = threading.Lock()
+        self._compact_file = None  # compact.lock, while this process holds it
+        self._compactor = None
+
+        # Group commit queue
+        self._queue = []
+        self._queue_cond = threading.Condition()
+        self._writing = False
+
+        self.commits = 0
+        self.records_written = 0
+        self.max_batch = 0
+        self.compactions = 0
+        self.load_seconds = 0.0
+        self._closed = False
+
+        # A forked worker (e.g. gunicorn --preload) must not share our open
+        # files: flock belongs to the open file, so it wouldn't exclude the
+        # parent and its other children
+        after_fork = weakref.WeakMethod(self._after_fork)
+        os.register_at_fork(after_in_child=lambda: after_fork() and after_fork()())
+
+        started = time.perf_counter()
+        with self._io_lock, self._flock(fcntl.LOCK_EX):
+            if not os.path.exists(self._path('CURRENT')):
+                self._write_current(0)
+            self._open_current(repair=True)
+        self.load_seconds = time.perf_counter() - started
+
+    # Files
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _flock(self, operation):
+        fcntl.flock(self._lock_fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _after_fork(self):
+        if self._closed:
+            return
+        self._lock = threading.Lock()
+        self._io_lock = threading.Lock()
+        self._queue = []
+        self._queue_cond = threading.Condition()
+        self._writing = False
+        # The compacting thread (if any) wasn't forked with us, and its lock
+        # must stay the parent's alone
+        if self._compact_file is not None:
+            self._compact_file.close()
+            self._compact_file = None
+        self._compact_lock = threading.Lock()
+        self._compactor = None
+        os.close(self._lock_fd)
+        os.close(self._log_fd)
+        self._lock_fd = os.open(self._path('lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        # The parent may have missed compactions by other processes (a
+        # preloading master never writes), so its generation can't be trusted:
+        # the next catch-up reloads whatever CURRENT names
+        self._log_fd = None
+        self._stale = True
+
+    def _write_current(self, generation):
+        tmp = self._path('CURRENT.tmp')
+        with open(tmp, 'w') as f:
+            f.write(f'{generation}\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path('CURRENT'))
+        self._fsync_directory()
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _open_current(self, repair=False):
+        """
+        (Re)load the current generation: its snapshot, then its log.
+        `repair` truncates a torn record at the end of the log, which is only
+        safe while holding the exclusive lock.
+        """
+        with open(self._path('CURRENT')) as f:
+            generation = int(f.read())
+        snapshot = self._path(f'snapshot-{generation}.bin')
+        known = len(self._ends)
+        skip = 0
+        self._snapshot_bytes = 0
+        if os.path.exists(snapshot):
+            # After another process compacted, the snapshot usually holds
+            # notes already in memory and needn't be read
+            count, loaded = _read_snapshot(snapshot, known=known)
+            if loaded is not None:
+                with self._lock:
+                    self._data, self._ends = loaded
+            else:
+                # The new log starts with the notes logged while the snapshot
+                # was written, some of them may be in memory too
+                skip = known - count
+            self._snapshot_bytes = os.path.getsize(snapshot)
+        log_fd = os.open(self._path(f'log-{generation}.bin'), os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        if self._log_fd is not None:
+            os.close(self._log_fd)
+        self._log_fd = log_fd
+        self._stale = False
+        self.generation = generation
+        self._log_pos = 0
+        self._log_records = 0
+        self._read_log(repair, skip)
+
+    def _read_log(self, repair=False, skip=0):
+        """Load log records past the ones already read, the first `skip` are already in memory"""
+        size = os.fstat(self._log_fd).st_size
+        if size <= self._log_pos:
+            return
+        buffer = os.pread(self._log_fd, size - self._log_pos, self._log_pos)
+        texts, used = _parse_records(buffer)
+        if repair and used < len(buffer):
+            # A crash in the middle of a write, drop the partial record
+            os.ftruncate(self._log_fd, self._log_pos + used)
+        self._append_memory(texts[skip:])
+        self._log_pos += used
+        self._log_records += len(texts)
+
+    def _append_memory(self, texts):
+        with self._lock:
+            for text in texts:
+                self._data += text
+                self._ends.append(len(self._data))
+
+    def _catch_up(self, locked=False):
+        """
+        Read what other processes wrote, switching generation if one compacted.
+        With the exclusive lock held (`locked`) nobody is mid-write, so a
+        partial record left at the end of the log is torn and gets cut off.
+        """
+        if self._stale or os.fstat(self._log_fd).st_nlink == 0:
+            if locked:
+                self._open_current(repair=True)
+            else:
+                with self._flock(fcntl.LOCK_SH):
+                    self._open_current()
+        else:
+            self._read_log(repair=locked)
+
+    def refresh(self):
+        """Pick up notes added by other processes"""
+        with self._io_lock:
+            self._catch_up()
+
+    # Writes
+
+    def add(self, text):
+        """Durably append a note, returns its id"""
+        entry = _Pending(text.encode('utf-8'))
+        with self._queue_cond:
+            self._queue.append(entry)
+            while not entry.done:
+                if self._writing:
+                    self._queue_cond.wait()
+                    continue
+                # Become the leader: commit everything queued so far in one write
+                self._writing = True
+                batch, self._queue = self._queue, []
+                self._queue_cond.release()
+                try:
+                    first_id, error = self._write_batch([e.payload for e in batch]), None
+                except Exception as e:
+                    first_id, error = None, e
+                finally:
+                    self._queue_cond.acquire()
+                for i, e in enumerate(batch):
+                    e.note_id = None if error else first_id + i
+                    e.error = error
+                    e.done = True
+                self._writing = False
+                self._queue_cond.notify_all()
+        if entry.error is not None:
+            raise entry.error
+        return entry.note_id
+
+    def _write_batch(self, payloads):
+        records = b''.join(_RECORD_HEADER.pack(len(p), zlib.crc32(p)) + p for p in payloads)
+        with self._io_lock, self._flock(fcntl.LOCK_EX):
+            # Ids follow the log order, so first read what others appended
+            self._catch_up(locked=True)
+            first_id = len(self._ends)
+            written = 0
+            while written < len(records):
+                written += os.write(self._log_fd, records[written:])
+            if self.fsync:
+                os.fsync(self._log_fd)
+            self._append_memory(payloads)
+            self._log_pos += len(records)
+            self._log_records += len(payloads)
+            self.commits += 1
+            self.records_written += len(payloads)
+            self.max_batch = max(self.max_batch, len(payloads))
+            if self._log_pos >= max(self.compact_min_bytes, self.compact_ratio * self._snapshot_bytes):
+                self._start_compaction()
+        return first_id
+
+    def _start_compaction(self):
+        """Compact in a background thread, unless one is already at it"""
+        if self._closed or (self._compactor is not None and self._compactor.is_alive()):
+            return
+        self._compactor = threading.Thread(target=self._compact_in_background,
+                                           name='note-store-compact', daemon=True)
+        self._compactor.start()
+
+    def _compact_in_background(self):
+        try:
+            self._compact(wait=False)
+        except Exception:
+            logger.exception('compacting the note store in %s failed', self.directory)
+
+    def compact(self):
+        """Fold the log into a new snapshot now"""
+        self._compact(wait=True)
+
+    def _compact(self, wait):
+        """
+        Write the next generation's snapshot, then switch to it and a log of
+        the notes added meanwhile. Returns False if another thread or process
+        was already compacting and not `wait`.
+        """
+        with self._compact_lock, open(self._path('compact.lock'), 'a') as compact_lock:
+            try:
+                fcntl.flock(compact_lock, fcntl.LOCK_EX | (0 if wait else fcntl.LOCK_NB))
+            except BlockingIOError:
+                return False
+            self._compact_file = compact_lock
+            try:
+                return self._compact_locked()
+            finally:
+                self._compact_file = None
+
+    def _compact_locked(self):
+        """Compact while holding compact.lock"""
+        if self._closed:
+            return False
+
+        # What the snapshot will hold: every note up to the end of the log
+        with self._io_lock, self._flock(fcntl.LOCK_EX):
+            self._catch_up(locked=True)
+            generation = self.generation
+            count, size = len(self._ends), len(self._data)
+            log_pos, log_records = self._log_pos, self._log_records
+
+        # The slow part, with no lock held: notes below `count` never change
+        snapshot = self._path(f'snapshot-{generation + 1}.bin')
+        self._write_snapshot(snapshot + '.tmp', count, size)
+
+        with self._io_lock, self._flock(fcntl.LOCK_EX):
+            self._catch_up(locked=True)
+            if self.generation != generation or self._closed:
+                os.remove(snapshot + '.tmp')
+                return False
+            # Notes logged since go on in the new log
+            tail = os.pread(self._log_fd, self._log_pos - log_pos, log_pos)
+            log = self._path(f'log-{generation + 1}.bin')
+            with open(log, 'wb') as f:
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(snapshot + '.tmp', snapshot)
+            self._write_current(generation + 1)
+            for name in (f'snapshot-{generation}.bin', f'log-{generation}.bin'):
+                if os.path.exists(self._path(name)):
+                    os.remove(self._path(name))
+            os.close(self._log_fd)
+            self._log_fd = os.open(log, os.O_RDWR | os.O_APPEND)
+            self.generation = generation + 1
+            self._log_pos = len(tail)
+            self._log_records -= log_records
+            self._snapshot_bytes = os.path.getsize(snapshot)
+            self.compactions += 1
+        return True
+
+    def _write_snapshot(self, path, count, size):
+        """
+        Write the first `count` notes (`size` bytes of text) as a snapshot,
+        copying them out of memory a block at a time so neither readers nor
+        writers wait for the whole copy
+        """
+        with open(path, 'wb') as f:
+            f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, count, size, 0))
+            crc = 0
+            step = _COPY_BLOCK // 8
+            for start in range(0, count, step):
+                with self._lock:
+                    offsets = self._ends[start:min(count, start + step)]
+                if sys.byteorder == 'big':
+                    offsets.byteswap()
+                crc = zlib.crc32(offsets, crc)
+                f.write(offsets)
+            for start in range(0, size, _COPY_BLOCK):
+                with self._lock:
+                    block = bytes(self._data[start:min(size, start + _COPY_BLOCK)])
+                crc = zlib.crc32(block, crc)
+                f.write(block)
+            f.seek(0)
+            f.write(_SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, count, size, crc))
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Reads
+
+    def __len__(self):
+        return len(self._ends)
+
+    @property
+    def version(self):
+        """Grows by one with every note added"""
+        return len(self._ends)
+
+    def get(self, note_id):
+        with self._lock:
+            start = self._ends[note_id - 1] if note_id else 0
+            return self._data[start:self._ends[note_id]].decode('utf-8')
+
+    def notes(self, start=0, stop=None):
+        """Notes with ids in range(start, stop), oldest first"""
+        with self._lock:
+            stop = len(self._ends) if stop is None else min(stop, len(self._ends))
+            ends, data = self._ends, self._data
+            return [data[ends[i - 1] if i else 0:ends[i]].decode('utf-8') for i in range(max(start, 0), stop)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'notes': len(self._ends),
+                'text_bytes': len(self._data),
+                'offset_bytes': len(self._ends) * self._ends.itemsize,
+                'generation': self.generation,
+                'log_bytes': self._log_pos,
+                'log_records': self._log_records,
+                'snapshot_bytes': self._snapshot_bytes,
+                'compacting': self._compactor is not None and self._compactor.is_alive(),
+                'commits': self.commits,
+                'records_written': self.records_written,
+                'max_batch': self.max_batch,
+                'compactions': self.compactions,
+                'load_ms': round(self.load_seconds * 1000, 1),
+            }
+
+    def close(self):
+        self._closed = True
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._io_lock:
+            if self._log_fd is not None:
+                os.close(self._log_fd)
+            os.close(self._lock_fd)
+
+
+class _Pending:
+    """A note waiting in the group commit queue"""
+    __slots__ = ('payload', 'note_id', 'error', 'done')
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.note_id = None
+        self.error = None
+        self.done = False
+
+
+def _parse_records(buffer):
+    """Complete, intact records at the start of `buffer`, returns (texts, bytes used)"""
+    texts = []
+    pos = 0
+    size = len(buffer)
+    header = _RECORD_HEADER.size
+    while pos + header <= size:
+        length, crc = _RECORD_HEADER.unpack_from(buffer, pos)
+        end = pos + header + length
+        if end > size:
+            break
+        text = buffer[pos + header:end]
+        if zlib.crc32(text) != crc:
+            break
+        texts.append(text)
+        pos = end
+    return texts, pos
+
+
+def _read_snapshot(path, known=-1):
+    """
+    Returns (note count, (text, end offsets)), with None instead of the notes
+    if it holds no more than `known`
+    """
+    with open(path, 'rb') as f:
+        magic, count, size, crc = _SNAPSHOT_HEADER.unpack(f.read(_SNAPSHOT_HEADER.size))
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f'{path} is not a note snapshot')
+        if count <= known:
+            return count, None
+        ends = array('Q')
+        ends.frombytes(f.read(count * ends.itemsize))
+        data = bytearray(f.read(size))
+    if len(ends) != count or len(data) != size or zlib.crc32(data, zlib.crc32(ends)) != crc:
+        raise ValueError(f'{path} is truncated or corrupt')
+    if sys.byteorder == 'big':
+        ends.byteswap()
+    return count, (data, ends)
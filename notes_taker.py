@@ -1,17 +1,259 @@
-from flask import Flask, render_template, request
+import json
+import os
+import threading
+import time
+
+from flask import Flask, jsonify, render_template, request, url_for
+
+from note_feed import Broadcaster
+from note_search import NoteIndex
+from note_store import NoteStore
 
 app = Flask(__name__)
+app.config['NOTES_DIR'] = os.path.join(app.instance_path, 'notes')  # where the note log lives
+app.config['NOTES_FSYNC'] = True               # fsync each group commit before answering
+app.config['NOTES_COMPACT_RATIO'] = 0.5        # log size, relative to the snapshot's, that starts a compaction
+app.config['NOTES_COMPACT_MIN_BYTES'] = 1 << 20  # smallest log compacted
+app.config['NOTES_PAGE_SIZE'] = 50             # notes shown per page
+app.config['NOTES_MAX_PAGE_SIZE'] = 500        # largest ?limit= accepted
+app.config['NOTES_SEARCH_LIMIT'] = 20          # search results shown by default
+app.config['NOTES_SEARCH_MAX_CANDIDATES'] = 20_000  # newest matches of the rarest term considered per search
+app.config['NOTES_STREAM_MAX_CLIENTS'] = 10_000  # live feed connections per process
+app.config['NOTES_STREAM_BUFFER'] = 256         # events buffered per client before it's dropped
+app.config['NOTES_STREAM_KEEPALIVE'] = 15       # seconds between keep-alive comments to idle clients
+app.config['NOTES_FEED_POLL'] = 1.0             # seconds between checks for notes added by other processes
+# Allow overrides such as FLASK_NOTES_DIR=/var/lib/notes from the environment
+app.config.from_prefixed_env()
+
+# Notes persist in an append-only log shared by every worker process
+store = NoteStore(app.config['NOTES_DIR'],
+                  fsync=app.config['NOTES_FSYNC'],
+                  compact_ratio=app.config['NOTES_COMPACT_RATIO'],
+                  compact_min_bytes=app.config['NOTES_COMPACT_MIN_BYTES'])
+# Full-text index over the store, kept up to date as notes come in
+search_index = NoteIndex()
+
+# Live feed of new notes, see notes_stream()
+broadcaster = Broadcaster(max_buffer=app.config['NOTES_STREAM_BUFFER'],
+                          max_clients=app.config['NOTES_STREAM_MAX_CLIENTS'])
+_feed_lock = threading.Lock()
+_feed_thread = None
+_published = store.version  # notes before this were never streamed
+
+def _page_limit():
+    """Page size from ?limit=, capped"""
+    limit = request.args.get('limit', app.config['NOTES_PAGE_SIZE'], type=int)
+    return max(1, min(limit, app.config['NOTES_MAX_PAGE_SIZE']))
+
+def _not_modified(etag):
+    """304 response if the client already has `etag`, else None"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+    return None
 
-# Store notes in a list (will persist during server runtime)
-notes = []
+def _with_etag(response, etag):
+    response = app.make_response(response)
+    response.set_etag(etag)
+    # Let browsers keep the page but check back every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 @app.route('/', methods=["GET", "POST"])  # Bug Fix #1: Added GET method
 def index():
     if request.method == "POST":  # Bug Fix #2: Check method before processing
         note = request.form.get("note")  # Bug Fix #3: Changed from request.args to request.form
+        note_id = None
         if note and note.strip():  # Bug Fix #4: Validate note is not empty
-            notes.append(note.strip())
-    return render_template("home_fixed.html", notes=notes)
+            note_id = store.add(note.strip())
+            search_index.update(store)
+            _publish_new()
+        if request.accept_mimetypes.best == 'application/json':
+            # The page's script posts in the background, the note comes
+            # back to it through the live feed
+            if note_id is None:
+                return jsonify({'error': 'note is empty'}), 400
+            return jsonify({'id': note_id}), 201
+    # Pick up notes added through other worker processes
+    store.refresh()
+    version = store.version
+    limit = _page_limit()
+
+    # Newest first; ?before=<id> pages back through older notes
+    before = request.args.get('before', version, type=int)
+    before = max(0, min(before, version))
+    start = max(0, before - limit)
+
+    # Notes never change once written, so an older page only depends on its
+    # cursor, while the newest page changes with every note added
+    if before == version:
+        etag = f'notes-v{version}-{limit}'
+    else:
+        etag = f'notes-b{before}-{limit}'
+    if request.method == "GET":
+        not_modified = _not_modified(etag)
+        if not_modified is not None:
+            return not_modified
+
+    notes = store.notes(start, before)[::-1]
+    older_url = url_for('index', before=start, limit=limit) if start > 0 else None
+    newest_url = url_for('index', limit=limit) if before < version else None
+    html = render_template("home.html", notes=notes, older_url=older_url, newest_url=newest_url,
+                           version=version)
+    if request.method == "POST":
+        return html
+    return _with_etag(html, etag)
+
+@app.route('/api/notes')
+def notes_since():
+    """
+    Notes added after a store version, oldest first (JSON).
+    ?since=<version> (default 0) &limit=<n>
+    Keep calling with the returned "version" to fetch only new notes.
+    """
+    store.refresh()
+    version = store.version
+    since = max(0, min(request.args.get('since', 0, type=int), version))
+    stop = min(version, since + _page_limit())
+    etag = f'notes-since-{since}-{stop}'
+    not_modified = _not_modified(etag)
+    if not_modified is not None:
+        return not_modified
+    notes = store.notes(since, stop)
+    return _with_etag(jsonify({
+        'version': stop,
+        'latest_version': version,
+        'has_more': stop < version,
+        'notes': [{'id': since + i, 'text': text} for i, text in enumerate(notes)],
+    }), etag)
+
+def _sse_note(note_id, text):
+    """A note as a Server-Sent Event, its id doubles as the resume point"""
+    data = json.dumps({'id': note_id, 'text': text})
+    return f'id: {note_id}\nevent: note\ndata: {data}\n\n'
+
+def _publish_new():
+    """Send the notes added since the last call to every live feed client"""
+    global _published
+    with _feed_lock:
+        version = store.version
+        if version > _published:
+            notes = store.notes(_published, version)
+            broadcaster.publish([_sse_note(_published + i, text) for i, text in enumerate(notes)])
+            _published = version
+
+def _poll_feed():
+    """Publish notes that other worker processes add"""
+    while True:
+        time.sleep(app.config['NOTES_FEED_POLL'])
+        try:
+            store.refresh()
+            _publish_new()
+        except Exception:
+            app.logger.exception('live feed poll failed')
+
+def _start_feed():
+    global _feed_thread
+    with _feed_lock:
+        if _feed_thread is None:
+            _feed_thread = threading.Thread(target=_poll_feed, name='notes-feed', daemon=True)
+            _feed_thread.start()
+
+@app.route('/api/notes/stream')
+def notes_stream():
+    """
+    New notes as Server-Sent Events ("note" events, data is {id, text}).
+    Reconnecting with Last-Event-ID (or ?since=<version>) first replays
+    the notes missed meanwhile, up to NOTES_MAX_PAGE_SIZE of them.
+    - Clients that fall NOTES_STREAM_BUFFER events behind are disconnected
+    - Each open stream holds a worker thread, serve with gevent (or another
+      async worker) to keep thousands of them open
+    """
+    since = request.args.get('since', type=int)
+    last_id = request.headers.get('Last-Event-ID', type=int)
+    if last_id is not None:
+        since = last_id + 1
+    _start_feed()
+    store.refresh()
+    _publish_new()
+    # Subscribe and note where the feed is at in one go, so no note is
+    # both replayed and streamed, or neither
+    with _feed_lock:
+        subscriber = broadcaster.subscribe()
+        published = _published
+    if subscriber is None:
+        return jsonify({'error': 'too many live feed clients'}), 503, {'Retry-After': '30'}
+    backlog = []
+    if since is not None:
+        since = max(since, published - app.config['NOTES_MAX_PAGE_SIZE'], 0)
+        backlog = [_sse_note(since + i, text) for i, text in enumerate(store.notes(since, published))]
+    keepalive = app.config['NOTES_STREAM_KEEPALIVE']
+
+    def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            yield from backlog
+            while True:
+                events = broadcaster.wait(subscriber, keepalive)
+                if events is None:
+                    # Dropped for falling behind, the browser reconnects
+                    return
+                if not events:
+                    # Keeps proxies from timing out idle streams, and finds
+                    # clients that went away
+                    yield ': keepalive\n\n'
+                yield from events
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return app.response_class(stream(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',  # don't let nginx buffer the stream
+    })
+
+@app.route('/api/notes/stream/stats')
+def notes_stream_stats():
+    return jsonify(broadcaster.stats())
+
+def _search():
+    """Run ?q= against the index, returns (query, results, match count, capped, ms)"""
+    query = request.args.get('q', '').strip()
+    limit = max(1, min(request.args.get('limit', app.config['NOTES_SEARCH_LIMIT'], type=int),
+                       app.config['NOTES_MAX_PAGE_SIZE']))
+    store.refresh()
+    search_index.update(store)
+    started = time.perf_counter()
+    best, matches, capped = search_index.search(query, limit, app.config['NOTES_SEARCH_MAX_CANDIDATES'])
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    results = [{'id': note_id, 'text': store.get(note_id), 'score': round(score, 4)}
+               for note_id, score in best]
+    return query, results, matches, capped, elapsed_ms
+
+@app.route('/search')
+def search():
+    """Notes matching every word of ?q= (word* matches a prefix), best first"""
+    query, results, matches, capped, elapsed_ms = _search()
+    return render_template("home.html", query=query, results=results, matches=matches,
+                           capped=capped, elapsed_ms=round(elapsed_ms, 2))
+
+@app.route('/api/search')
+def search_api():
+    """JSON version of /search, ?q=<words> &limit=<n>"""
+    query, results, matches, capped, elapsed_ms = _search()
+    return jsonify({
+        'query': query,
+        'results': results,
+        'matches': matches,
+        # True when only the newest notes were searched, so older ones may be missing
+        'capped': capped,
+        'elapsed_ms': round(elapsed_ms, 3),
+    })
+
+@app.route('/api/search/stats')
+def search_stats():
+    """Memory used by the search index"""
+    return jsonify(search_index.memory())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,129 @@
+"""
+Batch matching of many patterns against many strings.
+
+Patterns are joined into one alternation, (?:p0)(?P<_b0>)|(?:p1)(?P<_b1>)|...,
+so each string is scanned once and every match is attributed back to its
+pattern through the name of the empty marker group that closed last.
+
+The marker goes after each pattern rather than around it: a capturing group at
+the start of every branch stops sre from checking each branch's first literal
+and from building a first-character prefix set, which makes the scan roughly
+ten times slower than a loop over the patterns (see bench_batch.py).
+
+Note the combined scan has the same semantics as one big alternation: matches
+don't overlap, and where two patterns match at the same position the one
+submitted first wins. Pass overlap=True to scan each pattern on its own.
+"""
+import re
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from match_tasks import worker_cache
+
+_BACKREFS = (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS)
+
+
+def _has_backref(items):
+    for op, av in items:
+        if op in _BACKREFS or _nested_backref(av):
+            return True
+    return False
+
+
+def _nested_backref(value):
+    if isinstance(value, sre_parse.SubPattern):
+        return _has_backref(value)
+    if isinstance(value, (list, tuple)):
+        return any(_nested_backref(v) for v in value)
+    return False
+
+
+def _can_combine(pattern, flags):
+    """
+    A pattern can go into the alternation unless it relies on its own group
+    numbering or names (backreferences, named groups) or sets global flags.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    if parsed.state.groupdict or _has_backref(parsed):
+        return False
+    try:
+        re.compile(_branch(pattern, '_b0', flags), flags)
+    except re.error:
+        return False
+    return True
+
+
+def _branch(pattern, name, flags):
+    """One alternative of the combined pattern, with its marker group"""
+    # In verbose mode a trailing comment would swallow the closing parenthesis
+    end = '\n' if flags & re.VERBOSE else ''
+    return f'(?:{pattern}{end})(?P<{name}>)'
+
+
+def build_batch(patterns, flags, pattern_cache, overlap=False):
+    """
+    Split the submitted patterns into one combined alternation and a list of
+    patterns that have to be scanned separately (all of them with overlap=True).
+    `patterns` is a list of (pattern_id, pattern) pairs.
+    Returns (combined, group_ids, separate, errors).
+    """
+    pieces = []
+    group_ids = {}
+    separate = []
+    errors = {}
+    for pattern_id, pattern in patterns:
+        try:
+            pattern_cache.compile(pattern, flags)
+        except re.error as e:
+            errors[pattern_id] = f'Invalid regex pattern: {str(e)}'
+            continue
+        if not overlap and _can_combine(pattern, flags):
+            name = f'_b{len(pieces)}'
+            group_ids[name] = pattern_id
+            pieces.append(_branch(pattern, name, flags))
+        else:
+            separate.append((pattern_id, pattern))
+    combined = '|'.join(pieces) if pieces else None
+    return combined, group_ids, separate, errors
+
+
+def batch_match(combined, group_ids, separate, flags, strings, max_matches):
+    """
+    Worker task: match every string, scanning each one once with the combined
+    pattern (plus once per pattern that couldn't be combined).
+    Returns one (matches, truncated) pair per string, where matches are
+    (pattern_id, start, end, text) tuples in order of position.
+    """
+    compiled = worker_cache.compile(combined, flags) if combined else None
+    separate_compiled = [(pattern_id, worker_cache.compile(pattern, flags))
+                         for pattern_id, pattern in separate]
+    results = []
+    for text in strings:
+        matches = []
+        truncated = False
+        if compiled is not None:
+            for m in compiled.finditer(text):
+                if len(matches) >= max_matches:
+                    truncated = True
+                    break
+                matches.append((group_ids[m.lastgroup], m.start(), m.end(), m.group()))
+        for pattern_id, pattern in separate_compiled:
+            for m in pattern.finditer(text):
+                if len(matches) >= max_matches:
+                    truncated = True
+                    break
+                matches.append((pattern_id, m.start(), m.end(), m.group()))
+        if separate_compiled:
+            matches.sort(key=lambda match: (match[1], match[2]))
+        results.append((matches, truncated))
+    return results
+
+
+def chunked(items, size):
+    """Split a list into consecutive slices of at most `size` items"""
+    return [items[i:i + size] for i in range(0, len(items), size)]
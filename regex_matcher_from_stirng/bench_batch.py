@@ -0,0 +1,82 @@
+"""
+Benchmark: combined-alternation batch matching vs per-pattern findall loops.
+
+Usage: python bench_batch.py [--patterns 200] [--strings 2000] [--repeat 3]
+"""
+import argparse
+import random
+import re
+import string
+import time
+
+from batch_matcher import build_batch, batch_match
+from pattern_cache import PatternCache
+
+
+def make_patterns(count, rng):
+    """Mix of literal words, character classes and small quantified patterns"""
+    shapes = [
+        lambda: ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 6))),
+        lambda: rng.choice(string.ascii_lowercase) + r'\d{2,4}',
+        lambda: r'\b' + rng.choice(string.ascii_lowercase) + r'[a-z]{3}\b',
+        lambda: rng.choice('ABCDEFG') + r'-\d+',
+    ]
+    return [rng.choice(shapes)() for _ in range(count)]
+
+
+def make_strings(count, rng):
+    words = [''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 8)))
+             for _ in range(500)]
+    words += [f'{rng.choice("ABCDEFG")}-{rng.randint(0, 9999)}' for _ in range(50)]
+    return [' '.join(rng.choice(words) for _ in range(rng.randint(10, 40))) for _ in range(count)]
+
+
+def best_of(repeat, fn):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--patterns', type=int, default=200)
+    parser.add_argument('--strings', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    patterns = make_patterns(args.patterns, rng)
+    strings = make_strings(args.strings, rng)
+    total_chars = sum(map(len, strings))
+    compiled = [re.compile(p) for p in patterns]
+
+    def findall_loop():
+        return [[c.findall(text) for c in compiled] for text in strings]
+
+    combined, group_ids, separate, _ = build_batch(list(enumerate(patterns)), 0, PatternCache())
+
+    def combined_scan():
+        return batch_match(combined, group_ids, separate, 0, strings, 10 ** 9)
+
+    def separate_scan():
+        return batch_match(None, {}, list(enumerate(patterns)), 0, strings, 10 ** 9)
+
+    pairs = args.patterns * args.strings
+    print(f'{args.patterns} patterns x {args.strings} strings ({total_chars / 1e6:.2f} MB of text)')
+    print(f'{"method":<32}{"scans":>10}{"seconds":>10}{"pairs/s":>12}{"speedup":>9}')
+    baseline = None
+    for name, fn, scans in [
+        ('per-pattern findall loop', findall_loop, pairs),
+        ('batch, each pattern separately', separate_scan, pairs),
+        ('batch, combined alternation', combined_scan, args.strings),
+    ]:
+        seconds = best_of(args.repeat, fn)
+        baseline = baseline or seconds
+        print(f'{name:<32}{scans:>10}{seconds:>10.3f}{pairs / seconds:>12.0f}{baseline / seconds:>8.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark: linear-time engine vs re on pathological and ordinary patterns.
+
+Usage: python bench_linear.py [--timeout 5] [--ordinary-bytes 1000000]
+
+re runs in a killable worker, so a catastrophic case shows up as a timeout
+instead of hanging the benchmark.
+"""
+import argparse
+import random
+import string
+import time
+
+import match_tasks
+from linear_engine import compile_linear
+from safe_executor import WorkerPool, MatchTimeout
+
+# Pattern plus a function building an adversarial input of size n
+PATHOLOGICAL = [
+    (r'(a+)+$', lambda n: 'a' * n + '!'),
+    (r'(a|a)*b', lambda n: 'a' * n),
+    (r'(x+x+)+y', lambda n: 'x' * n),
+    (r'^(\w+\s?)*$', lambda n: 'word ' * (n // 5) + '!'),
+]
+PATHOLOGICAL_SIZES = [16, 20, 24, 28, 1000, 100_000]
+
+ORDINARY = [r'\d+', r'\w+@\w+\.com', r'\b[A-Z][a-z]+\b', r'ERROR|WARN']
+
+
+def make_text(size, rng):
+    words = [''.join(rng.choice(string.ascii_letters) for _ in range(rng.randint(2, 9)))
+             for _ in range(1000)]
+    words += [str(rng.randint(0, 99999)) for _ in range(100)]
+    words += ['ERROR', 'WARN', 'bob@example.com']
+    parts = []
+    length = 0
+    while length < size:
+        word = rng.choice(words)
+        parts.append(word)
+        length += len(word) + 1
+    return ' '.join(parts)[:size]
+
+
+def time_re(pool, pattern, text, timeout):
+    """Seconds for a full re scan in a worker, or None if it hit the deadline"""
+    start = time.perf_counter()
+    try:
+        pool.run(match_tasks.match_page, pattern, 0, text, 0, False, 0, 10 ** 9, timeout=timeout)
+    except MatchTimeout:
+        return None
+    return time.perf_counter() - start
+
+
+def time_linear(pattern, text):
+    linear = compile_linear(pattern)
+    start = time.perf_counter()
+    for _ in linear.finditer(text):
+        pass
+    return time.perf_counter() - start
+
+
+def fmt(seconds):
+    return 'timeout' if seconds is None else f'{seconds:.4f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--timeout', type=float, default=5.0)
+    parser.add_argument('--ordinary-bytes', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    pool = WorkerPool(size=1, timeout=args.timeout)
+    try:
+        print('Pathological patterns (seconds, re is skipped after its first timeout)')
+        print(f'{"pattern":<16}{"n":>9}{"re":>10}{"linear":>10}')
+        for pattern, make_input in PATHOLOGICAL:
+            re_gave_up = False
+            for n in PATHOLOGICAL_SIZES:
+                text = make_input(n)
+                re_seconds = None if re_gave_up else time_re(pool, pattern, text, args.timeout)
+                re_gave_up = re_seconds is None
+                print(f'{pattern:<16}{n:>9}{fmt(re_seconds):>10}{fmt(time_linear(pattern, text)):>10}')
+
+        text = make_text(args.ordinary_bytes, random.Random(42))
+        print(f'\nOrdinary patterns on {len(text) / 1e6:.2f} MB of text')
+        print(f'{"pattern":<20}{"re MB/s":>10}{"linear MB/s":>13}{"slowdown":>10}')
+        for pattern in ORDINARY:
+            re_seconds = time_re(pool, pattern, text, args.timeout)
+            linear_seconds = time_linear(pattern, text)
+            re_rate = f'{len(text) / re_seconds / 1e6:.1f}' if re_seconds else 'timeout'
+            slowdown = f'{linear_seconds / re_seconds:.0f}x' if re_seconds else '-'
+            print(f'{pattern:<20}{re_rate:>10}{len(text) / linear_seconds / 1e6:>13.2f}{slowdown:>10}')
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Regex scanning over large uploaded files.
+
+The file is memory-mapped and split into fixed-size chunks. Each chunk is
+scanned with finditer in a worker process, and the chunks are stitched back
+together in order so the result is the same as one finditer over the file.
+
+A match can only be so long for most patterns, so a chunk's search stops that
+far past the chunk and the chunks can be scanned in parallel. Patterns whose
+matches have no length limit (a*, .+) are scanned one chunk after the other:
+each search goes on to the next match, and the chunks before it are skipped.
+"""
+import json
+import mmap
+import os
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+from match_tasks import worker_cache
+
+_LOOKAROUNDS = (sre_constants.ASSERT, sre_constants.ASSERT_NOT)
+
+# Newlines are counted over slices of this size to keep memory bounded
+COUNT_BLOCK = 1 << 20
+
+
+def _count_newlines(mm, start, end):
+    """Count b'\\n' in mm[start:end] without copying the whole range"""
+    count = 0
+    while start < end:
+        stop = min(end, start + COUNT_BLOCK)
+        count += mm[start:stop].count(b'\n')
+        start = stop
+    return count
+
+
+def _lookahead(items):
+    """How far past the position it's tried at a lookahead in `items` can look"""
+    farthest = 0
+    for op, av in items:
+        if op in _LOOKAROUNDS and av[0] == 1:
+            farthest = max(farthest, av[1].getwidth()[1] + _lookahead(av[1]))
+        else:
+            farthest = max(farthest, _nested_lookahead(av))
+    return farthest
+
+
+def _nested_lookahead(value):
+    if isinstance(value, sre_parse.SubPattern):
+        return _lookahead(value)
+    if isinstance(value, (list, tuple)):
+        return max((_nested_lookahead(v) for v in value), default=0)
+    return 0
+
+
+def match_reach(pattern, flags=0):
+    """
+    How far past its start a match of `pattern` can depend on the text: its
+    longest match, plus lookaheads, plus one character for $, \\b and \\B.
+    None when matches can be any length.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    reach = parsed.getwidth()[1] + _lookahead(parsed)
+    if reach >= sre_constants.MAXREPEAT - 1:
+        return None
+    return reach + 1
+
+
+def scan_chunk(path, pattern, flags, chunk_start, chunk_end, scan_from, max_matches, reach=None):
+    """
+    Worker task: find the matches that start in [scan_from, chunk_end).
+    Matches may run past chunk_end, the caller stitches the chunks together.
+    The search stops `reach` (see match_reach) past chunk_end, or goes on
+    to the end of the file without one.
+    Returns (starts, ends, lines, newline_count, next_start), where lines are
+    counted from chunk_start, newline_count covers the whole chunk and
+    next_start is where the search found the next match (past the end of
+    the file if there is none). next_start is only known without `reach`.
+    """
+    compiled = worker_cache.compile(pattern, flags)
+    starts, ends, lines = array('q'), array('q'), array('q')
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # The last chunk also owns an empty match right at the end of the file
+        limit = chunk_end if chunk_end < len(mm) else chunk_end + 1
+        endpos = len(mm) if reach is None else min(len(mm), chunk_end + reach)
+        next_start = len(mm) + 1 if reach is None else None
+        line = _count_newlines(mm, chunk_start, scan_from)
+        pos = scan_from
+        for m in compiled.finditer(mm, scan_from, endpos):
+            if m.start() >= limit or len(starts) >= max_matches:
+                next_start = m.start()
+                break
+            line += _count_newlines(mm, pos, m.start())
+            pos = m.start()
+            starts.append(m.start())
+            ends.append(m.end())
+            lines.append(line)
+        newline_count = line + _count_newlines(mm, pos, chunk_end)
+    return starts, ends, lines, newline_count, next_start
+
+
+def _needs_rescan(result, carry, max_matches):
+    """
+    True when a match from the previous chunk ran into this one (ending at
+    `carry`) and this chunk's own scan may have skipped a match because of it,
+    or stopped at max_matches before getting past `carry`.
+    """
+    starts, ends = result[0], result[1]
+    for i, start in enumerate(starts):
+        if start >= carry:
+            return i > 0 and ends[i - 1] > carry
+    return len(starts) >= max_matches or (len(starts) > 0 and ends[-1] > carry)
+
+
+def scan_file(pool, path, pattern, flags=0, chunk_size=8 << 20, parallel=1,
+              max_matches=100_000, preview=200):
+    """
+    Generator of NDJSON lines for every match of `pattern` (bytes) in the file.
+    - `parallel` chunks are scanned at once, results still come out in order
+      (one at a time for patterns without a longest match)
+    - Each match line has the byte offset, end, 1-based line number and text
+    - A final summary line reports the count and whether the cap was hit
+    """
+    started = time.perf_counter()
+    size = os.path.getsize(path)
+    count = 0
+
+    if size:
+        chunks = [(start, min(size, start + chunk_size))
+                  for start in range(0, size, chunk_size)]
+        reach = match_reach(pattern, flags)
+        if reach is None:
+            parallel = 1
+
+        def run(chunk_start, chunk_end, scan_from):
+            return pool.run(scan_chunk, path, pattern, flags,
+                            chunk_start, chunk_end, scan_from, max_matches, reach)
+
+        with open(path, 'rb') as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+                ThreadPoolExecutor(max_workers=parallel) as threads:
+            # Keep only a small window of chunks in flight so memory stays bounded
+            pending = []
+            next_chunk = 0
+            base_line = 1
+            carry = 0  # end of the last match emitted so far
+            next_start = 0  # without a reach: where the next match starts
+            for chunk_start, chunk_end in chunks:
+                if reach is None:
+                    # Scanned in order from the last match, so nothing is skipped
+                    if max(carry, next_start) >= (chunk_end if chunk_end < size else size + 1):
+                        # No match starts in this chunk
+                        base_line += _count_newlines(mm, chunk_start, chunk_end)
+                        continue
+                    result = run(chunk_start, chunk_end, max(chunk_start, carry, next_start))
+                    next_start = result[4]
+                else:
+                    while next_chunk < len(chunks) and len(pending) < parallel * 2:
+                        pending.append(threads.submit(run, *chunks[next_chunk], chunks[next_chunk][0]))
+                        next_chunk += 1
+                    result = pending.pop(0).result()
+
+                    if carry > chunk_start:
+                        if carry >= chunk_end and chunk_end < size:
+                            # A single match covered this whole chunk
+                            base_line += result[3]
+                            continue
+                        if _needs_rescan(result, carry, max_matches):
+                            result = run(chunk_start, chunk_end, carry)
+
+                starts, ends, lines, newline_count, _ = result
+                for start, end, line in zip(starts, ends, lines):
+                    if start < carry:
+                        continue
+                    text = mm[start:min(end, start + preview)].decode('utf-8', 'replace')
+                    yield json.dumps({
+                        'offset': start,
+                        'end': end,
+                        'line': base_line + line,
+                        'match': text,
+                    }) + '\n'
+                    carry = end
+                    count += 1
+                    if count >= max_matches:
+                        break
+                base_line += newline_count
+                if count >= max_matches:
+                    for future in pending:
+                        future.cancel()
+                    break
+
+    elif worker_cache.compile(pattern, flags).search(b''):
+        # An empty file can't be memory-mapped, but it can hold an empty match
+        yield json.dumps({'offset': 0, 'end': 0, 'line': 1, 'match': ''}) + '\n'
+        count = 1
+
+    yield json.dumps({
+        'done': True,
+        'matches': count,
+        'truncated': count >= max_matches,
+        'bytes': size,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }) + '\n'
@@ -0,0 +1,462 @@
+"""
+Linear-time regex matching for a safe subset of Python regex syntax.
+
+Patterns are parsed with the standard library's own parser (so the syntax is
+exactly what `re` accepts) and then compiled into a Thompson NFA. Anything
+the NFA can't express, like backreferences, lookarounds or atomic groups,
+raises Unsupported so the caller can fall back to `re`.
+
+Matching simulates the NFA with ordered thread lists (a Pike VM), which gives
+the same leftmost-first results as `re`. One search takes O(len(text) *
+len(program)) time whatever the pattern. finditer starts a new search after
+each match, and a search may have to read to the end of the text to rule out
+a longer, preferred match, so listing all matches is O(len(text)^2 *
+len(program)) in the worst case (a*b|a on a long run of a's). It never
+backtracks exponentially, but callers still need a time limit.
+
+The epsilon-closure and step for each (thread list, context, character) are
+computed once and kept in a lazily built DFA cache, which is simply cleared
+when it grows past its cap.
+
+Only whole-match spans are produced, capture groups are not tracked.
+"""
+import re
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+
+class Unsupported(ValueError):
+    """The pattern uses syntax outside the linear engine's subset"""
+
+
+# Largest program compiled, counted in NFA instructions
+MAX_PROGRAM = 20_000
+
+# NFA instructions
+CHAR, SPLIT, JUMP, ASSERT, MATCH = range(5)
+
+# Context bits describing the position being looked at
+_AT_START = 1          # position 0
+_AT_END = 2            # position len(text)
+_AFTER_NEWLINE = 4     # previous character is '\n'
+_BEFORE_NEWLINE = 8    # current character is '\n'
+_LAST_NEWLINE = 16     # current character is a '\n' that ends the text
+_PREV_WORD = 32        # previous character is a word character
+_CUR_WORD = 64         # current character is a word character
+_EMPTY_TEXT = 128      # the whole text is empty
+_FORBID_EMPTY = 256    # an empty match may not end here (just after one)
+
+# Thread slot used for a thread started at the current position
+_NEW = -1
+
+
+def _row_key(state, ctx, inject):
+    """Pack a DFA row key into one int (ctx uses 9 bits)"""
+    return (state << 10) | (ctx << 1) | inject
+
+
+# ---------------------------------------------------------------------------
+# Character tests
+# ---------------------------------------------------------------------------
+#
+# Each single-character item (literal, class, dot) is turned back into a
+# one-character `re` pattern with the same flags, so case folding and Unicode
+# categories behave exactly as in `re`. Matching one character can't
+# backtrack, and the results end up cached in the DFA anyway.
+
+_CATEGORIES = {
+    'CATEGORY_DIGIT': r'\d', 'CATEGORY_NOT_DIGIT': r'\D',
+    'CATEGORY_WORD': r'\w', 'CATEGORY_NOT_WORD': r'\W',
+    'CATEGORY_SPACE': r'\s', 'CATEGORY_NOT_SPACE': r'\S',
+}
+
+# Flags that change what a single character matches
+_CHAR_FLAGS = re.IGNORECASE | re.DOTALL | re.ASCII
+
+
+def _class_source(items):
+    """Rebuild the inside of a [...] class from a parsed IN item list"""
+    parts = []
+    for op, av in items:
+        if op == sre_constants.NEGATE:
+            parts.insert(0, '^')
+        elif op == sre_constants.LITERAL:
+            parts.append(re.escape(chr(av)))
+        elif op == sre_constants.RANGE:
+            parts.append(f'{re.escape(chr(av[0]))}-{re.escape(chr(av[1]))}')
+        elif op == sre_constants.CATEGORY and str(av) in _CATEGORIES:
+            parts.append(_CATEGORIES[str(av)])
+        else:
+            raise Unsupported(f'unsupported class item {op} {av}')
+    return ''.join(parts)
+
+
+def _char_test(source, flags):
+    """Predicate telling whether one character matches `source`"""
+    fullmatch = re.compile(source, flags & _CHAR_FLAGS).fullmatch
+    return lambda c: fullmatch(c) is not None
+
+
+# Parsed items that match exactly one character
+CHAR_OPS = (sre_constants.LITERAL, sre_constants.NOT_LITERAL, sre_constants.ANY, sre_constants.IN)
+
+
+def char_test(op, av, flags):
+    """Predicate telling whether one character matches a parsed CHAR_OPS item"""
+    if op == sre_constants.LITERAL:
+        source = re.escape(chr(av))
+    elif op == sre_constants.NOT_LITERAL:
+        source = f'[^{re.escape(chr(av))}]'
+    elif op == sre_constants.ANY:
+        source = '.'
+    else:
+        source = f'[{_class_source(av)}]'
+    return _char_test(source, flags)
+
+
+def _nullable(items):
+    """True if the parsed sequence can match the empty string"""
+    for op, av in items:
+        if op == sre_constants.AT:
+            continue
+        if op == sre_constants.SUBPATTERN:
+            if not _nullable(av[-1]):
+                return False
+        elif op == sre_constants.BRANCH:
+            if not any(_nullable(branch) for branch in av[1]):
+                return False
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            if av[0] > 0 and not _nullable(av[2]):
+                return False
+        else:
+            return False
+    return True
+
+
+# ---------------------------------------------------------------------------
+# Parsed pattern -> NFA program
+# ---------------------------------------------------------------------------
+
+class _Compiler:
+    def __init__(self, global_flags):
+        self.global_flags = global_flags
+        self.program = []
+        self.has_asserts = False
+
+    def emit(self, op, *args):
+        if len(self.program) >= MAX_PROGRAM:
+            raise Unsupported(f'pattern expands to more than {MAX_PROGRAM} NFA states')
+        self.program.append([op, *args])
+        return len(self.program) - 1
+
+    def compile_list(self, items, flags):
+        for op, av in items:
+            self.compile_item(op, av, flags)
+
+    def compile_item(self, op, av, flags):
+        if op in CHAR_OPS:
+            self.emit(CHAR, char_test(op, av, flags))
+        elif op == sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, body = av
+            self.compile_list(body, (flags | add_flags) & ~del_flags)
+        elif op == sre_constants.BRANCH:
+            self.compile_branch(av[1], flags)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            low, high, body = av
+            if high > 1 and _nullable(body):
+                # re stops a loop after an empty iteration, which a Pike VM
+                # can't reproduce exactly, e.g. (a?)+ or (?:x*|y)*
+                raise Unsupported('repeating a group that can match empty is not supported')
+            self.compile_repeat(low, high, body, flags, greedy=op == sre_constants.MAX_REPEAT)
+        elif op == sre_constants.AT:
+            if (flags & re.ASCII) != (self.global_flags & re.ASCII) and 'BOUNDARY' in str(av):
+                raise Unsupported('\\b with a scoped ASCII flag is not supported')
+            self.has_asserts = True
+            self.emit(ASSERT, _assert_bits(av, flags))
+        else:
+            raise Unsupported(f'{str(op).lower()} is not supported by the linear engine')
+
+    def compile_branch(self, branches, flags):
+        # SPLIT chain: first branch has the highest priority
+        jumps = []
+        for i, branch in enumerate(branches):
+            if i < len(branches) - 1:
+                split = self.emit(SPLIT, None, None)
+                self.program[split][1] = len(self.program)
+                self.compile_list(branch, flags)
+                jumps.append(self.emit(JUMP, None))
+                self.program[split][2] = len(self.program)
+            else:
+                self.compile_list(branch, flags)
+        for jump in jumps:
+            self.program[jump][1] = len(self.program)
+
+    def compile_repeat(self, low, high, body, flags, greedy):
+        for _ in range(low):
+            self.compile_list(body, flags)
+        if high == sre_constants.MAXREPEAT:
+            # loop: SPLIT(body, out); body; JUMP loop
+            loop = self.emit(SPLIT, None, None)
+            self.compile_list(body, flags)
+            self.emit(JUMP, loop)
+            self._set_split(loop, loop + 1, len(self.program), greedy)
+            return
+        # (high - low) optional copies, each one skipping to the end
+        splits = []
+        for _ in range(high - low):
+            split = self.emit(SPLIT, None, None)
+            splits.append(split)
+            self.compile_list(body, flags)
+        for split in splits:
+            self._set_split(split, split + 1, len(self.program), greedy)
+
+    def _set_split(self, split, body, out, greedy):
+        self.program[split][1:] = [body, out] if greedy else [out, body]
+
+
+def _assert_bits(at_code, flags):
+    """Turn an AT_* code into a test on the context bits, see _assert_holds"""
+    name = str(at_code)
+    multiline = bool(flags & re.MULTILINE)
+    if name == 'AT_BEGINNING':
+        return ('any', _AT_START | _AFTER_NEWLINE) if multiline else ('any', _AT_START)
+    if name == 'AT_BEGINNING_STRING':
+        return ('any', _AT_START)
+    if name == 'AT_END':
+        if multiline:
+            return ('any', _AT_END | _BEFORE_NEWLINE)
+        return ('any', _AT_END | _LAST_NEWLINE)
+    if name == 'AT_END_STRING':
+        return ('any', _AT_END)
+    if name == 'AT_BOUNDARY':
+        return ('boundary', True)
+    if name == 'AT_NON_BOUNDARY':
+        return ('boundary', False)
+    raise Unsupported(f'unsupported anchor {name}')
+
+
+def _assert_holds(test, ctx):
+    kind, value = test
+    if kind == 'any':
+        return bool(ctx & value)
+    if ctx & _EMPTY_TEXT:
+        return False
+    boundary = bool(ctx & _PREV_WORD) != bool(ctx & _CUR_WORD)
+    return boundary == value
+
+
+# ---------------------------------------------------------------------------
+# Matcher
+# ---------------------------------------------------------------------------
+
+class LinearPattern:
+    """
+    A compiled pattern that searches in linear time.
+    Raises Unsupported from the constructor if the pattern is outside the subset.
+    """
+
+    def __init__(self, pattern, flags=0, max_transitions=100_000):
+        if isinstance(pattern, bytes):
+            raise Unsupported('bytes patterns are not supported')
+        parsed = sre_parse.parse(pattern, flags)
+        flags = parsed.state.flags
+        if flags & re.LOCALE:
+            raise Unsupported('LOCALE is not supported')
+        compiler = _Compiler(flags)
+        compiler.compile_list(parsed, flags)
+        compiler.emit(MATCH)
+
+        self.pattern = pattern
+        self.flags = flags
+        self.program = compiler.program
+        self.needs_context = compiler.has_asserts
+        # Word characters for \b and \B, as re sees them
+        self._word = re.compile(r'\w', flags & re.ASCII).fullmatch
+        self.max_transitions = max_transitions
+
+        # Lazy DFA: thread lists (tuples of pcs) are interned as states, and
+        # rows keyed by (state, context, inject) map a character to a transition
+        self._state_ids = {}
+        self._states = []
+        self._rows = {}
+        self._transition_count = 0
+        self.cache_resets = 0
+        self._empty = self._intern(())
+
+    def _intern(self, pcs):
+        state = self._state_ids.get(pcs)
+        if state is None:
+            state = len(self._states)
+            self._state_ids[pcs] = state
+            self._states.append(pcs)
+        return state
+
+    def _reset_cache(self):
+        self._state_ids.clear()
+        self._states.clear()
+        self._rows = {}
+        self._transition_count = 0
+        self.cache_resets += 1
+        self._empty = self._intern(())
+
+    def cache_stats(self):
+        return {
+            'states': len(self._states),
+            'transitions': self._transition_count,
+            'max_transitions': self.max_transitions,
+            'resets': self.cache_resets,
+            'program_size': len(self.program),
+        }
+
+    def _closure(self, pcs, inject, ctx):
+        """
+        Follow epsilon moves for the threads `pcs` (in priority order), plus a
+        new thread at the lowest priority if `inject`. Returns the consuming
+        (pc, slot) pairs and the slot of the thread that reached MATCH first
+        (lower-priority threads after a match are cut, as in leftmost-first).
+        """
+        program = self.program
+        seen = set()
+        out = []
+        entries = [(pc, slot) for slot, pc in enumerate(pcs)]
+        if inject:
+            entries.append((0, _NEW))
+        for pc, slot in entries:
+            stack = [pc]
+            while stack:
+                p = stack.pop()
+                if p in seen:
+                    continue
+                seen.add(p)
+                instr = program[p]
+                op = instr[0]
+                if op == CHAR:
+                    out.append((p, slot))
+                elif op == SPLIT:
+                    stack.append(instr[2])
+                    stack.append(instr[1])
+                elif op == JUMP:
+                    stack.append(instr[1])
+                elif op == ASSERT:
+                    if _assert_holds(instr[1], ctx):
+                        stack.append(p + 1)
+                elif op == MATCH:
+                    if slot == _NEW and ctx & _FORBID_EMPTY:
+                        continue
+                    return out, slot
+        return out, None
+
+    def _transition(self, state, inject, ctx, c):
+        """Closure + step, cached: returns (next state, parent slots, matched slot)"""
+        out, matched = self._closure(self._states[state], inject, ctx)
+        program = self.program
+        next_pcs = []
+        parents = []
+        if c is not None:
+            for p, slot in out:
+                if program[p][1](c):
+                    next_pcs.append(p + 1)
+                    parents.append(slot)
+        if self._transition_count >= self.max_transitions:
+            # Cap the cache: start over rather than grow without bound
+            pcs = self._states[state]
+            self._reset_cache()
+            state = self._intern(pcs)
+        result = (self._intern(tuple(next_pcs)), tuple(parents), matched)
+        self._rows.setdefault(_row_key(state, ctx, inject), {})[c] = result
+        self._transition_count += 1
+        return result
+
+    def _context(self, text, i, n, forbid):
+        ctx = 0
+        if forbid == i:
+            ctx |= _FORBID_EMPTY
+        if not self.needs_context:
+            return ctx
+        if n == 0:
+            ctx |= _EMPTY_TEXT
+        if i == 0:
+            ctx |= _AT_START
+        else:
+            prev = text[i - 1]
+            if prev == '\n':
+                ctx |= _AFTER_NEWLINE
+            if self._word(prev):
+                ctx |= _PREV_WORD
+        if i == n:
+            ctx |= _AT_END
+        else:
+            cur = text[i]
+            if cur == '\n':
+                ctx |= _BEFORE_NEWLINE
+                if i == n - 1:
+                    ctx |= _LAST_NEWLINE
+            if self._word(cur):
+                ctx |= _CUR_WORD
+        return ctx
+
+    def search(self, text, pos=0, forbid=None):
+        """
+        Leftmost-first match starting at or after `pos`, as (start, end) or None.
+        `forbid` is a position where an empty match is not allowed (finditer
+        sets it right after an empty match, like `re` does).
+        """
+        n = len(text)
+        rows = self._rows
+        needs_context = self.needs_context
+        state = self._empty
+        starts = []
+        best = None
+        inject = 1
+        i = pos
+        while True:
+            if needs_context:
+                ctx = self._context(text, i, n, forbid)
+            else:
+                ctx = _FORBID_EMPTY if i == forbid else 0
+            c = text[i] if i < n else None
+            row = rows.get(_row_key(state, ctx, inject))
+            result = row.get(c) if row is not None else None
+            if result is None:
+                result = self._transition(state, inject, ctx, c)
+                rows = self._rows
+            state, parents, matched = result
+            if matched is not None:
+                best = (i if matched == _NEW else starts[matched], i)
+                inject = 0
+            if c is None:
+                return best
+            if parents:
+                starts = [i if parent == _NEW else starts[parent] for parent in parents]
+            elif best is not None:
+                return best
+            else:
+                starts = []
+            i += 1
+
+    def finditer(self, text, pos=0):
+        """
+        Yield (start, end) for every non-overlapping match, like re.finditer.
+        Each match is a new search, so this is quadratic in the worst case.
+        """
+        forbid = None
+        n = len(text)
+        while pos <= n:
+            match = self.search(text, pos, forbid)
+            if match is None:
+                return
+            yield match
+            start, end = match
+            forbid = end if start == end else None
+            pos = end
+
+
+def compile_linear(pattern, flags=0):
+    """Compile a pattern for the linear engine (raises Unsupported or re.error)"""
+    re.compile(pattern, flags)  # report syntax errors exactly like re does
+    return LinearPattern(pattern, flags)
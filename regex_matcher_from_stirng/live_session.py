@@ -0,0 +1,365 @@
+"""
+Live-edit sessions: the server keeps a document's text and match spans, and
+after each edit rescans only around the edited range.
+
+A match attempt at position p looks back at most at text[p - 1] (for \\b, and
+^ with MULTILINE) and then reads forward. When the pattern has no lookarounds
+and that forward read is bounded, either by the pattern's maximum width or
+because it can never consume a newline (so an attempt stops at the end of its
+line), attempts far enough before the edit give the same results as before
+and attempts past it give the old results, shifted. So:
+- matches before the edit are kept
+- the text is rescanned from there until the scan is back in step with the
+  old matches after the edit
+- the remaining old matches are kept
+Patterns without such a bound are rescanned in full after every edit.
+
+Old matches after the edit are stored as distances from the end of the text
+(a gap buffer), which an edit before them doesn't change, so keeping them
+costs nothing however many there are.
+"""
+import bisect
+import secrets
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+import match_tasks
+from linear_engine import CHAR_OPS, Unsupported, char_test
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+# Widest pattern whose width alone bounds the rescan window
+MAX_REACH = 4096
+# Characters rescanned per worker call to start with, doubled as needed
+MIN_WINDOW = 1024
+
+
+def _has_lookaround(items):
+    for op, av in items:
+        if op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+            return True
+        if op == sre_constants.BRANCH:
+            if any(_has_lookaround(branch) for branch in av[1]):
+                return True
+        elif op == sre_constants.GROUPREF_EXISTS:
+            if any(branch is not None and _has_lookaround(branch) for branch in av[1:]):
+                return True
+        elif op == sre_constants.SUBPATTERN:
+            if _has_lookaround(av[-1]):
+                return True
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+                    getattr(sre_constants, 'POSSESSIVE_REPEAT', None)):
+            if _has_lookaround(av[2]):
+                return True
+        elif op == getattr(sre_constants, 'ATOMIC_GROUP', None):
+            if _has_lookaround(av):
+                return True
+    return False
+
+
+def _can_consume_newline(items, flags):
+    """True if some part of the parsed pattern could consume a '\\n'"""
+    for op, av in items:
+        if op in CHAR_OPS:
+            try:
+                if char_test(op, av, flags)('\n'):
+                    return True
+            except Unsupported:
+                return True
+        elif op in (sre_constants.AT, sre_constants.GROUPREF):
+            # Anchors consume nothing, backreferences repeat consumed text
+            continue
+        elif op == sre_constants.BRANCH:
+            if any(_can_consume_newline(branch, flags) for branch in av[1]):
+                return True
+        elif op == sre_constants.GROUPREF_EXISTS:
+            if any(branch is not None and _can_consume_newline(branch, flags) for branch in av[1:]):
+                return True
+        elif op == sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, body = av
+            if _can_consume_newline(body, (flags | add_flags) & ~del_flags):
+                return True
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+                    getattr(sre_constants, 'POSSESSIVE_REPEAT', None)):
+            if _can_consume_newline(av[2], flags):
+                return True
+        elif op == getattr(sre_constants, 'ATOMIC_GROUP', None):
+            if _can_consume_newline(av, flags):
+                return True
+        else:
+            return True
+    return False
+
+
+def pattern_reach(pattern, flags=0):
+    """
+    How far past its start a match attempt can read, as (width, line_bounded):
+    - width: the pattern's maximum width, None if unbounded or over MAX_REACH
+    - line_bounded: True if the pattern never consumes a '\\n'
+    Returns None when neither bounds it, or it has lookarounds.
+    """
+    parsed = sre_parse.parse(pattern, flags)
+    if _has_lookaround(parsed):
+        return None
+    width = parsed.getwidth()[1]
+    reach = (width if width <= MAX_REACH else None,
+             not _can_consume_newline(parsed, parsed.state.flags))
+    return reach if reach != (None, False) else None
+
+
+def last_safe_start(text, limit, reach):
+    """
+    Last position whose match attempt can't read text[limit - 1:], or -1.
+    Attempts up to there give the same results whatever text follows
+    limit - 1, and however long the text is.
+    """
+    width, line_bounded = reach
+    safe = -1
+    if width is not None:
+        safe = limit - width - 2
+    if line_bounded:
+        safe = max(safe, text.rfind('\n', 0, max(limit - 1, 0)))
+    return safe
+
+
+def text_diff(old, new):
+    """A single edit (start, end, inserted) turning `old` into `new`"""
+    limit = min(len(old), len(new))
+    # Binary search the common prefix and suffix, comparing slices in C
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[:mid] == new[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    prefix = low
+    low, high = 0, limit - prefix
+    while low < high:
+        mid = (low + high + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return prefix, len(old) - low, new[prefix:len(new) - low]
+
+
+class LiveSession:
+    """
+    A document being edited, with the spans of every match in it.
+    Spans are kept in a gap buffer around the last edit:
+    - head: spans before the gap as positions, in order
+    - tail: spans after it as distances from the end of the text, nearest the gap last
+    """
+
+    def __init__(self, pattern, flags, text):
+        self.id = secrets.token_urlsafe(16)
+        self.pattern = pattern
+        self.flags = flags
+        self.reach = pattern_reach(pattern, flags)
+        self.text = text
+        self.version = 0
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self._head_starts = array('q')
+        self._head_ends = array('q')
+        self._tail_starts = array('q')
+        self._tail_ends = array('q')
+
+    @property
+    def count(self):
+        return len(self._head_starts) + len(self._tail_starts)
+
+    def spans(self):
+        """Every match span, in order"""
+        n = len(self.text)
+        spans = list(zip(self._head_starts, self._head_ends))
+        spans += [(n - s, n - e) for s, e in zip(reversed(self._tail_starts), reversed(self._tail_ends))]
+        return spans
+
+    def full_scan(self, pool):
+        """Scan the whole text, returns the change as from apply_edit"""
+        removed = self.count
+        self._head_starts, self._head_ends = pool.run(
+            match_tasks.window_matches, self.pattern, self.flags, self.text, 0, 0, True, len(self.text))
+        self._tail_starts = array('q')
+        self._tail_ends = array('q')
+        return {'index': 0, 'removed': removed, 'delta': 0, 'full_scan': True,
+                'inserted': list(zip(self._head_starts, self._head_ends))}
+
+    def _move_gap(self, position):
+        """Move the gap so the head holds exactly the spans starting before `position`"""
+        n = len(self.text)
+        to_position = n.__sub__
+        head_starts, head_ends = self._head_starts, self._head_ends
+        tail_starts, tail_ends = self._tail_starts, self._tail_ends
+        # Both halves are sorted, so the spans to move are a slice at the end of one
+        k = len(tail_starts) - bisect.bisect_right(tail_starts, n - position)
+        if k:
+            head_starts.extend(map(to_position, reversed(tail_starts[-k:])))
+            head_ends.extend(map(to_position, reversed(tail_ends[-k:])))
+            del tail_starts[-k:], tail_ends[-k:]
+        k = len(head_starts) - bisect.bisect_left(head_starts, position)
+        if k:
+            tail_starts.extend(map(to_position, reversed(head_starts[-k:])))
+            tail_ends.extend(map(to_position, reversed(head_ends[-k:])))
+            del head_starts[-k:], head_ends[-k:]
+
+    def apply_edit(self, pool, start, end, inserted):
+        """
+        Replace text[start:end] with `inserted` and update the matches.
+        Returns the change to the span list: replace `removed` spans from
+        `index` on with the `inserted` ones, and shift the spans after them
+        by `delta`.
+        """
+        old = self.text
+        if not 0 <= start <= end <= len(old):
+            raise ValueError('Edit range is outside the text')
+        delta = len(inserted) - (end - start)
+        if self.reach is None:
+            self.text = old[:start] + inserted + old[end:]
+            change = self.full_scan(pool)
+            change['delta'] = delta
+            return change
+
+        # Keep the spans found by attempts that can't see the edit, up to
+        # the last non-empty one, so the scan resumes in the same state
+        safe = last_safe_start(old, start, self.reach)
+        self._move_gap(safe + 1)
+        head_starts, head_ends = self._head_starts, self._head_ends
+        tail_starts, tail_ends = self._tail_starts, self._tail_ends
+        trimmed = False
+        while head_starts and head_starts[-1] == head_ends[-1]:
+            tail_starts.append(len(old) - head_starts.pop())
+            tail_ends.append(len(old) - head_ends.pop())
+            trimmed = True
+        index = len(head_starts)
+        pos = head_ends[-1] if head_starts else 0
+        if not trimmed:
+            # Nothing started between the last kept span and `safe` either
+            pos = max(pos, safe + 1)
+
+        # Tail distances from the end hold for the new text too
+        text = self.text = old[:start] + inserted + old[end:]
+        n = len(text)
+        sync_from = start + len(inserted) + 1
+        removed = 0
+        last_old = None  # last old span dropped from the tail, old positions
+
+        def try_sync(first, last):
+            """
+            Position in [first, last] where both scans search afresh, or None.
+            The new scan is searching afresh over that range.
+            """
+            nonlocal removed, last_old
+            first = max(first, sync_from)
+            if first > last:
+                return None
+            old_pos = first - delta
+            while tail_starts and len(old) - tail_starts[-1] < old_pos:
+                last_old = (len(old) - tail_starts.pop(), len(old) - tail_ends.pop())
+                removed += 1
+            if last_old is None or last_old[1] < old_pos or (last_old[1] == old_pos and last_old[0] < old_pos):
+                return first
+            if last_old[1] > old_pos and last_old[1] + delta <= last:
+                return last_old[1] + delta
+            return None
+
+        first_new = len(head_starts)
+        fresh = True
+        window = max(MIN_WINDOW, 4 * (self.reach[0] or 0))
+        while True:
+            window_end = min(n, pos + window)
+            if window_end < n:
+                last = last_safe_start(text, window_end, self.reach)
+                if last < pos:
+                    window *= 2
+                    continue
+            else:
+                last = n
+            base = pos - 1 if pos else 0
+            starts, ends = pool.run(match_tasks.window_matches, self.pattern, self.flags,
+                                    text[base:window_end], base, pos, fresh, last)
+            synced = None
+            for s, e in zip(starts, ends):
+                synced = try_sync(pos if fresh else pos + 1, s)
+                if synced is not None:
+                    break
+                head_starts.append(s)
+                head_ends.append(e)
+                pos, fresh = e, s != e
+            else:
+                synced = try_sync(pos if fresh else pos + 1, last if window_end == n else last + 1)
+            if synced is not None or window_end == n:
+                break
+            if pos <= last:
+                pos, fresh = last + 1, True
+
+        if synced is None:
+            # Scanned to the end, none of the old spans after the edit survive
+            removed += len(tail_starts)
+            del tail_starts[:], tail_ends[:]
+        return {'index': index, 'removed': removed, 'delta': delta, 'full_scan': False,
+                'inserted': list(zip(head_starts[first_new:], head_ends[first_new:]))}
+
+
+class SessionStore:
+    """Live sessions by id, dropped past `max_sessions` (least recently used first) or after `ttl` idle seconds"""
+
+    def __init__(self, max_sessions=100, ttl=600):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def _expire(self, now):
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_used <= self.ttl:
+                break
+            del self._sessions[session.id]
+            self.expirations += 1
+
+    def add(self, session):
+        with self._lock:
+            self._expire(time.monotonic())
+            self._sessions[session.id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, session_id):
+        """Return the session and mark it used, or None if unknown or expired"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.last_used = now
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def remove(self, session_id):
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return {
+                'sessions': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'ttl': self.ttl,
+                'text_chars': sum(len(s.text) for s in self._sessions.values()),
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,108 @@
+"""
+Matching functions that run inside the worker processes.
+
+Kept in their own small module so the workers only import `re`, the linear
+engine and the pattern cache, not Flask or the web app.
+"""
+import re
+from array import array
+
+from linear_engine import Unsupported, compile_linear
+from pattern_cache import PatternCache
+
+# Each worker process keeps its own compiled patterns
+worker_cache = PatternCache(maxsize=256)
+linear_cache = PatternCache(maxsize=64, compiler=compile_linear, errors=(re.error, Unsupported))
+
+
+def ping():
+    """Used to pre-warm a freshly started worker"""
+    return True
+
+
+def iter_matches(pattern, flags, text, pos=0, engine='re'):
+    """
+    Lazily yield (start, end, text, groups) for each match, with the chosen engine.
+    Returns (engine that ran, fallback reason or None, iterator).
+    The linear engine falls back to re for patterns outside its subset,
+    and doesn't report groups.
+    """
+    if engine == 'linear':
+        try:
+            linear = linear_cache.compile(pattern, flags)
+        except Unsupported as e:
+            fallback = str(e)
+        else:
+            spans = linear.finditer(text, pos)
+            return 'linear', None, ((s, e, text[s:e], ()) for s, e in spans)
+    else:
+        fallback = None
+    compiled = worker_cache.compile(pattern, flags)
+    matches = ((m.start(), m.end(), m.group(0), m.groups()) for m in compiled.finditer(text, pos))
+    return 're', fallback, matches
+
+
+def match_page(pattern, flags, text, pos, after_empty, page_size, count_cap, engine='re'):
+    """
+    Collect one page of matches lazily, starting at `pos`.
+    - Matches are (start, end, text, groups) tuples
+    - Counting goes on past the page up to `count_cap`, after that the
+      total is estimated from how far into the text the count got
+    - `after_empty` resumes just after an empty match at `pos` (the last one
+      of the previous page), which isn't repeated
+    """
+    engine, fallback, matches = iter_matches(pattern, flags, text, pos, engine)
+    page = []
+    count = 0
+    scanned_to = len(text)
+    for match in matches:
+        if after_empty:
+            after_empty = False
+            if match[0] == match[1] == pos:
+                continue
+        count += 1
+        if len(page) < page_size:
+            page.append(match)
+        if count >= count_cap:
+            scanned_to = match[1]
+            break
+
+    capped = count >= count_cap and scanned_to < len(text)
+    estimate = count
+    if capped:
+        # Assume matches keep the same density over the rest of the text
+        estimate = round(count * (len(text) - pos) / max(1, scanned_to - pos))
+    return {
+        'matches': page,
+        'count': count,
+        'count_capped': capped,
+        'count_estimate': estimate,
+        'has_more': count > len(page),
+        'engine': engine,
+        'fallback_reason': fallback,
+    }
+
+
+def window_matches(pattern, flags, text, base, pos, fresh, last_start):
+    """
+    Spans of the matches starting at or before `last_start`, scanning a window
+    of a longer text from `pos`. `text` is the window, which starts at `base`
+    in the longer text, positions in and out are in the longer text.
+    If not `fresh` the scan resumes just after an empty match at `pos`.
+    Returns two arrays, starts and ends.
+    """
+    compiled = worker_cache.compile(pattern, flags)
+    starts = array('q')
+    ends = array('q')
+    skip_empty = not fresh
+    for m in compiled.finditer(text, pos - base):
+        start, end = m.start() + base, m.end() + base
+        if skip_empty:
+            skip_empty = False
+            if start == end == pos:
+                continue
+        if start > last_start:
+            break
+        starts.append(start)
+        ends.append(end)
+    return starts, ends
@@ -0,0 +1,91 @@
+"""
+Helpers for paging through regex results.
+
+Submitted test strings are kept in a small byte-bounded store keyed by their
+digest, so a page cursor only needs to carry the digest and a position.
+"""
+import base64
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from markupsafe import escape
+
+
+def text_digest(text):
+    """Stable digest of a test string"""
+    return hashlib.sha256(text.encode('utf-8', 'surrogatepass')).hexdigest()
+
+
+class TextStore:
+    """LRU store of recent test strings, evicted by total size in bytes"""
+
+    def __init__(self, max_bytes=64 << 20):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._texts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, text):
+        """Store a text and return its digest"""
+        digest = text_digest(text)
+        size = len(text)
+        with self._lock:
+            if digest in self._texts:
+                self._texts.move_to_end(digest)
+                return digest
+            self._texts[digest] = text
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes and len(self._texts) > 1:
+                _, old = self._texts.popitem(last=False)
+                self.total_bytes -= len(old)
+        return digest
+
+    def get(self, digest):
+        """Return the stored text, or None if it was evicted"""
+        with self._lock:
+            text = self._texts.get(digest)
+            if text is not None:
+                self._texts.move_to_end(digest)
+            return text
+
+
+def encode_cursor(**fields):
+    """Pack cursor fields into an opaque URL-safe string"""
+    raw = json.dumps(fields, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Unpack a cursor made by encode_cursor, raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        fields = json.loads(raw)
+    except Exception:
+        raise ValueError('Malformed cursor')
+    if not isinstance(fields, dict):
+        raise ValueError('Malformed cursor')
+    return fields
+
+
+def highlight(text, spans, limit):
+    """
+    Escape text[:limit] and wrap every (start, end) span in <mark>, in one pass.
+    Spans must be sorted and non-overlapping, as finditer returns them.
+    """
+    parts = []
+    last = 0
+    for start, end in spans:
+        if start >= limit:
+            break
+        if end == start:
+            continue
+        end = min(end, limit)
+        parts.append(str(escape(text[last:start])))
+        parts.append(f'<mark>{escape(text[start:end])}</mark>')
+        last = end
+    parts.append(str(escape(text[last:limit])))
+    if len(text) > limit:
+        parts.append(f'<span class="truncated">... ({len(text) - limit} more characters not shown)</span>')
+    return ''.join(parts)
@@ -0,0 +1,92 @@
+import copy
+import re
+import threading
+from collections import OrderedDict
+
+# Flags that can be toggled from the form, by name
+FLAG_NAMES = {
+    'IGNORECASE': re.IGNORECASE,
+    'MULTILINE': re.MULTILINE,
+    'DOTALL': re.DOTALL,
+    'VERBOSE': re.VERBOSE,
+}
+
+
+def parse_flags(names):
+    """Turn a list of flag names (e.g. from checkboxes) into an re flags value"""
+    flags = 0
+    for name in names:
+        flag = FLAG_NAMES.get(name.upper())
+        if flag is not None:
+            flags |= flag
+    return flags
+
+
+def flag_names(flags):
+    """Turn an re flags value back into the list of flag names"""
+    return [name for name, flag in FLAG_NAMES.items() if flags & flag]
+
+
+class PatternCache:
+    """
+    Bounded LRU cache of compiled regex patterns keyed by (pattern, flags).
+    - Compile errors are cached too, so a bad pattern fails fast next time
+    - Keeps hit/miss counters so the hit rate can be checked
+    - `compiler` and `errors` allow caching another engine's patterns
+    """
+
+    def __init__(self, maxsize=1024, compiler=re.compile, errors=(re.error,)):
+        self.maxsize = maxsize
+        self.compiler = compiler
+        self.errors = errors
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def compile(self, pattern, flags=0):
+        """Return the compiled pattern, or raise the cached compile error"""
+        key = (pattern, flags)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        if entry is None:
+            # Compile outside the lock so a slow compile doesn't block others
+            try:
+                entry = self.compiler(pattern, flags)
+            except self.errors as e:
+                # Keep the error, not the frames of the request that hit it
+                entry = e.with_traceback(None)
+            with self._lock:
+                self.misses += 1
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        if isinstance(entry, BaseException):
+            # Raise a copy: raising the cached error itself would chain every
+            # caller's frames onto its traceback and keep them alive
+            raise copy.copy(entry)
+        return entry
+
+    def clear(self):
+        """Drop every cached pattern (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Return cache counters as a dict"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
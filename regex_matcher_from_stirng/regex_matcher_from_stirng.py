@@ -1,29 +1,242 @@
-from flask import Flask, request
+from flask import Flask, Request, request, jsonify, Response, url_for
+import json
+import os
 import re
+import shutil
+import tempfile
+import time
+
+import match_tasks
+from batch_matcher import build_batch, batch_match, chunked
+from concurrent.futures import ThreadPoolExecutor
+from file_scanner import scan_file
+from linear_engine import Unsupported, compile_linear
+from live_session import LiveSession, SessionStore, text_diff
+from markupsafe import escape
+from pagination import TextStore, encode_cursor, decode_cursor, highlight, text_digest
+from pattern_cache import PatternCache, FLAG_NAMES, parse_flags, flag_names
+from regex_profiler import profile_pattern
+from result_cache import ResultCache
+from safe_executor import WorkerPool, MatchTimeout, WorkerCrashed, screen_pattern
 
 app = Flask(__name__)
+app.config['REGEX_CACHE_SIZE'] = 1024
+app.config['REGEX_POOL_SIZE'] = 2             # worker processes used for matching
+app.config['REGEX_TIMEOUT'] = 2.0             # seconds before a match is killed
+app.config['REGEX_MAX_INPUT'] = 1_000_000     # max test string length (characters)
+app.config['REGEX_MAX_PATTERN'] = 1000        # max pattern length (characters)
+app.config['REGEX_SCREEN_PATTERNS'] = True    # reject obviously exponential patterns
+app.config['REGEX_DEFAULT_ENGINE'] = 're'     # 're' (backtracking) or 'linear' (Thompson NFA, no backtracking)
+app.config['REGEX_UPLOAD_DIR'] = None         # where uploads are spooled (None = system temp)
+app.config['REGEX_FILE_WORKERS'] = os.cpu_count() or 2  # worker processes for file scans
+app.config['REGEX_FILE_CHUNK_SIZE'] = 8 << 20  # bytes scanned per worker task
+app.config['REGEX_FILE_CHUNK_TIMEOUT'] = 30.0  # seconds allowed per chunk
+app.config['REGEX_FILE_MAX_MATCHES'] = 100_000 # hard cap on matches streamed back
+app.config['REGEX_PAGE_SIZE'] = 100           # matches rendered per page
+app.config['REGEX_COUNT_CAP'] = 10_000        # matches counted before the total is estimated
+app.config['REGEX_DISPLAY_CHARS'] = 20_000    # characters of the test string shown highlighted
+app.config['REGEX_TEXT_STORE_BYTES'] = 64 << 20  # test strings kept for page cursors
+app.config['REGEX_RESULT_CACHE_BYTES'] = 32 << 20  # match results kept for repeated requests
+app.config['REGEX_RESULT_COMPRESS_BYTES'] = 16 << 10  # results bigger than this are compressed
+app.config['REGEX_BATCH_MAX_PATTERNS'] = 1000  # patterns per batch request
+app.config['REGEX_BATCH_MAX_STRINGS'] = 100_000  # strings per batch request
+app.config['REGEX_BATCH_MAX_INPUT'] = 10_000_000  # total characters per batch request
+app.config['REGEX_BATCH_MAX_MATCHES'] = 1000  # matches returned per string
+app.config['REGEX_BATCH_CHUNK'] = 500         # strings per worker task, more fan out
+app.config['REGEX_BATCH_TIMEOUT'] = 10.0      # seconds allowed per worker task
+app.config['REGEX_PROFILE_REPEATS'] = 3       # timed runs per measurement (best is kept)
+app.config['REGEX_PROFILE_DOUBLINGS'] = 5     # times the test string is doubled in size
+app.config['REGEX_PROFILE_MAX_BYTES'] = 4 << 20  # largest scaled copy profiled
+app.config['REGEX_PROFILE_TIMEOUT'] = 10.0    # seconds before a profile run is killed
+app.config['REGEX_SESSION_MAX'] = 100         # live-edit sessions kept (least recently used dropped)
+app.config['REGEX_SESSION_TTL'] = 600         # seconds an idle live-edit session is kept
+# Allow overrides such as FLASK_REGEX_TIMEOUT=5 from the environment
+app.config.from_prefixed_env()
+
+
+
+class UploadRequest(Request):
+    """
+    Spools uploaded files to named files in REGEX_UPLOAD_DIR, so /scan can
+    link to one and memory-map it instead of copying it again
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.NamedTemporaryFile('wb+', prefix='regex-upload-', dir=app.config['REGEX_UPLOAD_DIR'])
+
+
+app.request_class = UploadRequest
+
+# Compiled patterns (and compile errors) shared by all requests
+pattern_cache = PatternCache(maxsize=app.config['REGEX_CACHE_SIZE'])
+linear_cache = PatternCache(maxsize=app.config['REGEX_CACHE_SIZE'], compiler=compile_linear,
+                            errors=(re.error, Unsupported))
+
+# Matching engines that can be picked from the form
+ENGINES = {
+    're': 'Backtracking (re)',
+    'linear': 'Thompson NFA (no backtracking)',
+}
+
+# Recent test strings, so later pages can be fetched with a cursor
+text_store = TextStore(max_bytes=app.config['REGEX_TEXT_STORE_BYTES'])
+
+# Pages of matches, so resubmitting the same pattern and text skips the scan
+result_cache = ResultCache(max_bytes=app.config['REGEX_RESULT_CACHE_BYTES'],
+                           compress_threshold=app.config['REGEX_RESULT_COMPRESS_BYTES'])
+
+# Live-edit sessions, each holding a document and its matches
+sessions = SessionStore(max_sessions=app.config['REGEX_SESSION_MAX'],
+                        ttl=app.config['REGEX_SESSION_TTL'])
+
+# Matching runs in worker processes so a runaway pattern can be killed
+_pool = None
+
+def _get_pool():
+    """Create the worker pool on first use, with the current config"""
+    global _pool
+    if _pool is None:
+        _pool = WorkerPool(size=app.config['REGEX_POOL_SIZE'],
+                           timeout=app.config['REGEX_TIMEOUT'])
+    return _pool
+
+_bulk_pool = None
+
+def _get_bulk_pool():
+    """Separate pool for file scans and large batches, so they don't starve the form"""
+    global _bulk_pool
+    if _bulk_pool is None:
+        _bulk_pool = WorkerPool(size=app.config['REGEX_FILE_WORKERS'],
+                                timeout=app.config['REGEX_FILE_CHUNK_TIMEOUT'])
+    return _bulk_pool
+
+_threads = None
+
+def _get_threads():
+    """
+    Threads that wait on the bulk pool for a batch's chunks. When the app is
+    mounted with others (combined_app.py) it uses their shared pool instead.
+    """
+    global _threads
+    shared = app.extensions.get('thread_pool')
+    if shared is not None:
+        return shared
+    if _threads is None:
+        _threads = ThreadPoolExecutor(max_workers=app.config['REGEX_FILE_WORKERS'],
+                                      thread_name_prefix='regex-batch')
+    return _threads
+
+def _linear_supported(regex_pattern, flags):
+    """True if the linear engine will run the pattern rather than fall back to re"""
+    try:
+        linear_cache.compile(regex_pattern, flags)
+    except (re.error, Unsupported):
+        return False
+    return True
+
+def _validate_input(regex_pattern, flags, test_string, engine='re'):
+    """Check size caps and screen the pattern, returns an error message or None"""
+    if len(regex_pattern) > app.config['REGEX_MAX_PATTERN']:
+        return f"Regex pattern is too long (max {app.config['REGEX_MAX_PATTERN']} characters)"
+    if len(test_string) > app.config['REGEX_MAX_INPUT']:
+        return f"Test string is too long (max {app.config['REGEX_MAX_INPUT']} characters)"
+    # The screen is for exponential backtracking, which the linear engine can't
+    # do. Listing every match with it can still be quadratic (see
+    # linear_engine.py), the worker deadline covers that.
+    if app.config['REGEX_SCREEN_PATTERNS'] and not (engine == 'linear' and _linear_supported(regex_pattern, flags)):
+        reason = screen_pattern(regex_pattern, flags)
+        if reason:
+            return f"Pattern rejected as potentially very slow: {reason}"
+    return None
+
+def _match_page(digest, test_string, regex_pattern, flags, engine, pos, after_empty, page_size, count_cap):
+    """One page of matches, from the result cache or found in a worker with a deadline"""
+    key = (regex_pattern, flags, engine, digest, pos, after_empty, page_size, count_cap)
+    page = result_cache.get(key)
+    if page is not None:
+        page['cached'] = True
+        return page
+    page = _get_pool().run(match_tasks.match_page, regex_pattern, flags, test_string,
+                           pos, after_empty, page_size, count_cap, engine)
+    result_cache.put(key, page)
+    page['cached'] = False
+    return page
+
+def _next_cursor(test_string, regex_pattern, flags, page, first_index):
+    """Cursor for the page after `page`, or None if it was the last one"""
+    if not page['has_more'] or not page['matches']:
+        return None
+    # Resume where the last match ended, like finditer does: an empty match
+    # there has already been listed if the last match was empty itself
+    last_start, last_end = page['matches'][-1][:2]
+    return encode_cursor(d=text_store.put(test_string), p=regex_pattern, f=flags,
+                         g=page['engine'], pos=last_end, e=int(last_start == last_end),
+                         n=first_index + len(page['matches']))
+
+def _run_profile(regex_pattern, flags, test_string, scale=True):
+    """Profile a pattern in a worker, returns (report, error message)"""
+    try:
+        pattern_cache.compile(regex_pattern, flags)
+        error = _validate_input(regex_pattern, flags, test_string)
+        if error:
+            return None, error
+        # The worker stops doubling at half the deadline, so it returns a partial report
+        timeout = app.config['REGEX_PROFILE_TIMEOUT']
+        report = _get_pool().run(profile_pattern, regex_pattern, flags, test_string,
+                                 app.config['REGEX_PROFILE_REPEATS'],
+                                 app.config['REGEX_PROFILE_DOUBLINGS'] if scale else 0,
+                                 app.config['REGEX_PROFILE_MAX_BYTES'], timeout / 2,
+                                 timeout=timeout)
+    except re.error as e:
+        return None, f"Invalid regex pattern: {str(e)}"
+    except (MatchTimeout, WorkerCrashed) as e:
+        return None, f"Profiling stopped: {str(e)}"
+    report['pattern'] = regex_pattern
+    report['flags'] = flag_names(flags)
+    return report, None
 
 @app.route('/', methods=['GET', 'POST'])
 def home():
     """Regex matcher - takes test string and regex pattern, displays all matches"""
     
     # Initialize variables
-    matches = []
+    page = None
+    profile = None
     error = None
     test_string = ''
     regex_pattern = ''
+    selected_flags = []
+    scale = True
+    engine = app.config['REGEX_DEFAULT_ENGINE']
     
     # Handle form submission
     if request.method == 'POST':
         test_string = request.form.get('test_string', '')
         regex_pattern = request.form.get('regex_pattern', '')
+        selected_flags = request.form.getlist('flags')
+        scale = bool(request.form.get('scale'))
+        engine = request.form.get('engine', engine)
+        if engine not in ENGINES:
+            engine = 're'
         
-        if test_string and regex_pattern:
+        if test_string and regex_pattern and request.form.get('action') == 'profile':
+            profile, error = _run_profile(regex_pattern, parse_flags(selected_flags), test_string, scale)
+        elif test_string and regex_pattern:
+            flags = parse_flags(selected_flags)
             try:
-                # Find all matches using regex
-                matches = re.findall(regex_pattern, test_string)
+                # Compile here too so bad patterns fail fast without using a worker
+                pattern_cache.compile(regex_pattern, flags)
+                error = _validate_input(regex_pattern, flags, test_string, engine)
+                if not error:
+                    # First page of matches, found lazily in a worker unless it's cached
+                    page = _match_page(text_digest(test_string), test_string, regex_pattern, flags,
+                                       engine, 0, False, app.config['REGEX_PAGE_SIZE'],
+                                       app.config['REGEX_COUNT_CAP'])
+                    page['cursor'] = _next_cursor(test_string, regex_pattern, flags, page, 0)
             except re.error as e:
                 error = f"Invalid regex pattern: {str(e)}"
+            except (MatchTimeout, WorkerCrashed) as e:
+                error = f"Matching stopped: {str(e)}"
     
     # Build HTML response
     html = f"""
@@ -88,6 +301,23 @@ def home():
             button:hover {{
                 background: #45a049;
             }}
+            button.secondary {{
+                background: #607d8b;
+                margin-top: 10px;
+            }}
+            button.secondary:hover {{
+                background: #546e7a;
+            }}
+            table {{
+                width: 100%;
+                border-collapse: collapse;
+                background: white;
+            }}
+            th, td {{
+                padding: 8px;
+                text-align: right;
+                border-bottom: 1px solid #ddd;
+            }}
             .results {{
                 margin-top: 30px;
                 padding: 20px;
@@ -110,11 +340,49 @@ def home():
                 border-radius: 5px;
                 border-left: 3px solid #4CAF50;
             }}
+            .match-span {{
+                color: #999;
+                font-size: 0.85em;
+                margin-left: 10px;
+            }}
+            .highlighted {{
+                background: white;
+                padding: 10px;
+                border-radius: 5px;
+                font-family: monospace;
+                white-space: pre-wrap;
+                word-break: break-all;
+                max-height: 300px;
+                overflow: auto;
+            }}
+            mark {{
+                background: #c8e6c9;
+            }}
+            .truncated {{
+                color: #999;
+            }}
             .match-count {{
                 font-weight: bold;
                 color: #4CAF50;
                 margin-bottom: 15px;
             }}
+            .flags {{
+                display: flex;
+                gap: 15px;
+                flex-wrap: wrap;
+            }}
+            .flags label {{
+                display: inline;
+                font-weight: normal;
+            }}
+            .flags input, .flags select {{
+                width: auto;
+            }}
+            .scan-form {{
+                margin-top: 30px;
+                padding-top: 20px;
+                border-top: 1px solid #ddd;
+            }}
             .info {{
                 background: #e3f2fd;
                 padding: 15px;
@@ -146,11 +414,48 @@ def home():
                            placeholder="e.g., \\d+, [a-z]+, \\w+" required>
                 </div>
                 
-                <button type="submit">Find Matches</button>
+                <div class="form-group flags">
+                    {_render_flag_options(selected_flags)}
+                    <label><input type="checkbox" name="scale" value="1"{" checked" if scale else ""}> Profile on doubled copies</label>
+                </div>
+                
+                <div class="form-group flags">
+                    <label for="engine">Engine:</label>
+                    <select name="engine" id="engine">{_render_engine_options(engine)}</select>
+                </div>
+                
+                <button type="submit" name="action" value="match">Find Matches</button>
+                <button type="submit" name="action" value="profile" class="secondary">Profile Pattern</button>
+            </form>
+            
+            <form class="scan-form" method="POST" action="{url_for('scan')}" enctype="multipart/form-data">
+                <h3>Scan a File</h3>
+                <div class="form-group">
+                    <label>File (matches stream back as NDJSON):</label>
+                    <input type="file" name="file" required>
+                </div>
+                
+                <div class="form-group">
+                    <label>Regular Expression:</label>
+                    <input type="text" name="regex_pattern" placeholder="e.g., ERROR \\d+" required>
+                </div>
+                
+                <div class="form-group flags">
+                    {_render_flag_options([])}
+                    <label><input type="checkbox" name="parallel" value="1"> Parallel chunks</label>
+                </div>
+                
+                <div class="form-group">
+                    <label>Max Matches:</label>
+                    <input type="number" name="max_matches" min="1" value="1000">
+                </div>
+                
+                <button type="submit">Scan File</button>
             </form>
             
             {_render_error(error) if error else ''}
-            {_render_results(test_string, regex_pattern, matches) if request.method == 'POST' and not error else ''}
+            {_render_results(test_string, regex_pattern, page) if page is not None and not error else ''}
+            {_render_profile(profile) if profile is not None else ''}
         </div>
     </body>
     </html>
@@ -158,30 +463,457 @@ def home():
     
     return html
 
+@app.route('/scan', methods=['POST'])
+def scan():
+    """Scan an uploaded file with a regex, streaming matches back as NDJSON"""
+    upload = request.files.get('file')
+    regex_pattern = request.form.get('regex_pattern', '')
+    if not upload or not regex_pattern:
+        return jsonify({'error': 'Please upload a file and enter a regex pattern'}), 400
+
+    # The file is scanned as bytes, so the pattern is too
+    flags = parse_flags(request.form.getlist('flags'))
+    try:
+        pattern_cache.compile(regex_pattern.encode('utf-8'), flags)
+    except re.error as e:
+        return jsonify({'error': f'Invalid regex pattern: {str(e)}'}), 400
+    error = _validate_input(regex_pattern, flags, '')
+    if error:
+        return jsonify({'error': error}), 400
+
+    cap = app.config['REGEX_FILE_MAX_MATCHES']
+    max_matches = max(1, min(request.form.get('max_matches', cap, type=int) or cap, cap))
+    parallel = app.config['REGEX_FILE_WORKERS'] if request.form.get('parallel') else 1
+
+    # The upload is already on disk (see UploadRequest), a second link to it
+    # outlives the request, which deletes the original name when it ends
+    upload.stream.flush()
+    path = upload.stream.name + '.scan'
+    try:
+        os.link(upload.stream.name, path)
+    except OSError:
+        # A filesystem without hard links
+        shutil.copyfile(upload.stream.name, path)
+
+    def remove_upload():
+        if os.path.exists(path):
+            os.remove(path)
+
+    def generate():
+        try:
+            yield from scan_file(_get_bulk_pool(), path, regex_pattern.encode('utf-8'), flags,
+                                 chunk_size=app.config['REGEX_FILE_CHUNK_SIZE'],
+                                 parallel=parallel, max_matches=max_matches)
+        except (MatchTimeout, WorkerCrashed) as e:
+            yield json.dumps({'error': f'Matching stopped: {str(e)}'}) + '\n'
+        finally:
+            remove_upload()
+
+    response = Response(generate(), mimetype='application/x-ndjson')
+    # Also clean up if the client goes away before the scan starts
+    response.call_on_close(remove_upload)
+    return response
+
+@app.route('/matches')
+def more_matches():
+    """Next page of matches (JSON) for a cursor returned with an earlier page"""
+    try:
+        fields = decode_cursor(request.args.get('cursor', ''))
+        digest, regex_pattern = str(fields['d']), str(fields['p'])
+        flags, pos, first_index = int(fields['f']), int(fields['pos']), int(fields['n'])
+        after_empty = bool(fields['e'])
+        engine = str(fields.get('g', 're'))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return jsonify({'error': 'Malformed cursor'}), 400
+
+    test_string = text_store.get(digest)
+    if test_string is None:
+        return jsonify({'error': 'Test string expired, please submit it again'}), 410
+
+    try:
+        pattern_cache.compile(regex_pattern, flags)
+        error = _validate_input(regex_pattern, flags, test_string, engine)
+        if error:
+            return jsonify({'error': error}), 400
+        page_size = app.config['REGEX_PAGE_SIZE']
+        page = _match_page(digest, test_string, regex_pattern, flags, engine,
+                           pos, after_empty, page_size, page_size + 1)
+    except re.error as e:
+        return jsonify({'error': f'Invalid regex pattern: {str(e)}'}), 400
+    except (MatchTimeout, WorkerCrashed) as e:
+        return jsonify({'error': f'Matching stopped: {str(e)}'}), 503
+
+    return jsonify({
+        'matches': [
+            {'index': first_index + i + 1, 'start': start, 'end': end, 'match': match, 'groups': groups}
+            for i, (start, end, match, groups) in enumerate(page['matches'])
+        ],
+        'next_cursor': _next_cursor(test_string, regex_pattern, flags, page, first_index),
+        'cached': page['cached'],
+    })
+
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    Match many patterns against many strings in one request (JSON in, JSON out).
+    Body: {"patterns": [...] or {"name": "pattern", ...}, "strings": [...],
+           "flags": ["IGNORECASE", ...], "overlap": false}
+    All patterns are combined into one alternation so each string is scanned
+    once. Set "overlap" to scan each pattern separately instead.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+
+    patterns = data.get('patterns')
+    if isinstance(patterns, dict):
+        pattern_items = list(patterns.items())
+    elif isinstance(patterns, list):
+        pattern_items = list(enumerate(patterns))
+    else:
+        return jsonify({'error': '"patterns" must be a list or an object'}), 400
+    strings = data.get('strings')
+    flag_list = data.get('flags', [])
+    if not pattern_items or not all(isinstance(p, str) and p for _, p in pattern_items):
+        return jsonify({'error': '"patterns" must contain non-empty strings'}), 400
+    if not isinstance(strings, list) or not all(isinstance(t, str) for t in strings):
+        return jsonify({'error': '"strings" must be a list of strings'}), 400
+    if not isinstance(flag_list, list) or not all(isinstance(f, str) for f in flag_list):
+        return jsonify({'error': '"flags" must be a list of flag names'}), 400
+
+    if len(pattern_items) > app.config['REGEX_BATCH_MAX_PATTERNS']:
+        return jsonify({'error': f"Too many patterns (max {app.config['REGEX_BATCH_MAX_PATTERNS']})"}), 400
+    if len(strings) > app.config['REGEX_BATCH_MAX_STRINGS']:
+        return jsonify({'error': f"Too many strings (max {app.config['REGEX_BATCH_MAX_STRINGS']})"}), 400
+    if sum(map(len, strings)) > app.config['REGEX_BATCH_MAX_INPUT']:
+        return jsonify({'error': f"Input is too large (max {app.config['REGEX_BATCH_MAX_INPUT']} characters)"}), 400
+
+    # Screen every pattern, the ones that fail are reported and skipped
+    flags = parse_flags(flag_list)
+    errors = {}
+    accepted = []
+    for pattern_id, pattern in pattern_items:
+        error = _validate_input(pattern, flags, '')
+        if error:
+            errors[pattern_id] = error
+        else:
+            accepted.append((pattern_id, pattern))
+    combined, group_ids, separate, compile_errors = build_batch(
+        accepted, flags, pattern_cache, overlap=bool(data.get('overlap')))
+    errors.update(compile_errors)
+    if combined is None and not separate:
+        return jsonify({'error': 'No valid patterns', 'errors': errors}), 400
+
+    # Small batches run in one worker, big ones fan out over the bulk pool
+    chunks = chunked(strings, app.config['REGEX_BATCH_CHUNK']) or [[]]
+    max_matches = app.config['REGEX_BATCH_MAX_MATCHES']
+    timeout = app.config['REGEX_BATCH_TIMEOUT']
+    try:
+        if len(chunks) == 1:
+            results = _get_pool().run(batch_match, combined, group_ids, separate, flags,
+                                      chunks[0], max_matches, timeout=timeout)
+        else:
+            pool = _get_bulk_pool()
+            parts = _get_threads().map(
+                lambda chunk: pool.run(batch_match, combined, group_ids, separate, flags,
+                                       chunk, max_matches, timeout=timeout),
+                chunks)
+            results = [result for part in parts for result in part]
+    except (MatchTimeout, WorkerCrashed) as e:
+        return jsonify({'error': f'Matching stopped: {str(e)}'}), 503
+
+    return jsonify({
+        'results': [
+            {
+                'index': i,
+                'matches': [
+                    {'pattern': pattern_id, 'start': start, 'end': end, 'match': text}
+                    for pattern_id, start, end, text in matches
+                ],
+                'truncated': truncated,
+            }
+            for i, (matches, truncated) in enumerate(results)
+        ],
+        'errors': errors,
+        'combined_patterns': len(group_ids),
+        'separate_patterns': len(separate),
+    })
+
+@app.route('/profile', methods=['POST'])
+def profile():
+    """
+    Profile a pattern against a test string (JSON or form body), returns JSON.
+    Body: {"regex_pattern": "...", "test_string": "...", "flags": [...], "scale": true}
+    """
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {'regex_pattern': request.form.get('regex_pattern', ''),
+                'test_string': request.form.get('test_string', ''),
+                'flags': request.form.getlist('flags'),
+                'scale': bool(request.form.get('scale', True))}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    regex_pattern = data.get('regex_pattern')
+    test_string = data.get('test_string')
+    flag_list = data.get('flags', [])
+    if not isinstance(regex_pattern, str) or not isinstance(test_string, str) or not regex_pattern or not test_string:
+        return jsonify({'error': 'Please enter a test string and a regex pattern'}), 400
+    if not isinstance(flag_list, list) or not all(isinstance(f, str) for f in flag_list):
+        return jsonify({'error': '"flags" must be a list of flag names'}), 400
+
+    report, error = _run_profile(regex_pattern, parse_flags(flag_list), test_string,
+                                 bool(data.get('scale', True)))
+    if error:
+        return jsonify({'error': error}), 400
+    return jsonify(report)
+
+def _session_state(session):
+    """JSON-ready state of a live session, with every match span"""
+    return {
+        'session': session.id,
+        'version': session.version,
+        'length': len(session.text),
+        'count': session.count,
+        'incremental': session.reach is not None,
+        'matches': session.spans(),
+    }
+
+@app.route('/sessions', methods=['POST'])
+def open_session():
+    """
+    Start a live-edit session (JSON in, JSON out).
+    Body: {"regex_pattern": "...", "test_string": "...", "flags": [...]}
+    Returns the session id and version and every match span.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+    regex_pattern = data.get('regex_pattern')
+    test_string = data.get('test_string', '')
+    flag_list = data.get('flags', [])
+    if not isinstance(regex_pattern, str) or not regex_pattern or not isinstance(test_string, str):
+        return jsonify({'error': 'Please enter a regex pattern and a test string'}), 400
+    if not isinstance(flag_list, list) or not all(isinstance(f, str) for f in flag_list):
+        return jsonify({'error': '"flags" must be a list of flag names'}), 400
+
+    flags = parse_flags(flag_list)
+    try:
+        pattern_cache.compile(regex_pattern, flags)
+    except re.error as e:
+        return jsonify({'error': f'Invalid regex pattern: {str(e)}'}), 400
+    error = _validate_input(regex_pattern, flags, test_string)
+    if error:
+        return jsonify({'error': error}), 400
+
+    session = LiveSession(regex_pattern, flags, test_string)
+    try:
+        session.full_scan(_get_pool())
+    except (MatchTimeout, WorkerCrashed) as e:
+        return jsonify({'error': f'Matching stopped: {str(e)}'}), 503
+    sessions.add(session)
+    return jsonify(_session_state(session)), 201
+
+@app.route('/sessions/<session_id>', methods=['GET', 'DELETE'])
+def session_state(session_id):
+    """Current text length, version and matches of a session (to resync), or close it"""
+    if request.method == 'DELETE':
+        if not sessions.remove(session_id):
+            return jsonify({'error': 'Unknown or expired session'}), 404
+        return '', 204
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    with session.lock:
+        return jsonify(_session_state(session))
+
+@app.route('/sessions/<session_id>/edits', methods=['POST'])
+def edit_session(session_id):
+    """
+    Apply edits to a live session and return how its matches changed.
+    Body: {"version": 3, "edits": [{"start": 10, "end": 12, "text": "xy"}, ...]}
+       or {"version": 3, "test_string": "..."} to send the whole new text
+    Each change means: replace `removed` spans from `index` on with the
+    `inserted` ones, then shift the spans after them by `delta`.
+    A stale version gets a 409, GET the session to resync.
+    """
+    session = sessions.get(session_id)
+    if session is None:
+        return jsonify({'error': 'Unknown or expired session'}), 404
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Expected a JSON object'}), 400
+
+    with session.lock:
+        if data.get('version') != session.version:
+            return jsonify({'error': 'Stale version, fetch the session to resync',
+                            'version': session.version}), 409
+
+        edits = data.get('edits')
+        if isinstance(data.get('test_string'), str):
+            edits = [dict(zip(('start', 'end', 'text'), text_diff(session.text, data['test_string'])))]
+        if not isinstance(edits, list):
+            return jsonify({'error': 'Expected "edits" or "test_string"'}), 400
+        # Check every edit before applying any, so a bad one leaves the session as it was
+        length = len(session.text)
+        for edit in edits:
+            if not isinstance(edit, dict) or not isinstance(edit.get('text', ''), str) \
+                    or not all(type(edit.get(k)) is int for k in ('start', 'end')):
+                return jsonify({'error': 'Each edit needs integer "start" and "end" and a string "text"'}), 400
+            if not 0 <= edit['start'] <= edit['end'] <= length:
+                return jsonify({'error': 'Edit range is outside the text'}), 400
+            length += len(edit.get('text', '')) - (edit['end'] - edit['start'])
+        if length > app.config['REGEX_MAX_INPUT']:
+            return jsonify({'error': f"Test string is too long (max {app.config['REGEX_MAX_INPUT']} characters)"}), 400
+
+        started = time.perf_counter()
+        try:
+            changes = [session.apply_edit(_get_pool(), edit['start'], edit['end'], edit.get('text', ''))
+                       for edit in edits]
+        except (MatchTimeout, WorkerCrashed) as e:
+            # The session is half way through an edit, so it can't be kept
+            sessions.remove(session_id)
+            return jsonify({'error': f'Matching stopped: {str(e)}, the session was closed'}), 503
+        session.version += 1
+        return jsonify({
+            'version': session.version,
+            'count': session.count,
+            'changes': changes,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2),
+        })
+
+@app.route('/stats')
+def stats():
+    """Pattern cache, result cache, live session and worker pool counters"""
+    return jsonify({
+        'pattern_cache': pattern_cache.stats(),
+        'result_cache': result_cache.stats(),
+        'sessions': sessions.stats(),
+        'worker_pool': _get_pool().stats(),
+    })
+
+def _render_flag_options(selected_flags):
+    """Render one checkbox per supported regex flag"""
+    return '\n'.join(
+        f'<label><input type="checkbox" name="flags" value="{name}"'
+        f'{" checked" if name in selected_flags else ""}> {name}</label>'
+        for name in FLAG_NAMES
+    )
+
+def _render_engine_options(selected):
+    """Render one <option> per matching engine"""
+    return ''.join(
+        f'<option value="{name}"{" selected" if name == selected else ""}>{label}</option>'
+        for name, label in ENGINES.items()
+    )
+
 def _render_error(error):
     """Render error message"""
     return f'<div class="error"><strong>Error:</strong> {error}</div>'
 
-def _render_results(test_string, regex_pattern, matches):
-    """Render match results"""
-    if not matches:
-        return '''
+def _render_profile(profile):
+    """Render a profile report in the results panel"""
+    rows = '\n'.join(
+        f'<tr><td>x{run["scale"]}</td><td>{run["bytes"]}</td><td>{run["matches"]}</td>'
+        f'<td>{run["match_ms"]}</td><td>{run["mb_per_s"]}</td></tr>'
+        for run in profile['runs']
+    )
+    verdict_class = 'error' if profile['super_linear'] else 'match-count'
+    stopped = '<p>Stopped doubling early to stay within the time budget.</p>' if profile['stopped_early'] else ''
+    return f'''
+    <div class="results">
+        <div class="{verdict_class}">Growth: {escape(profile['verdict'])}</div>
+        <div style="margin: 15px 0;"><strong>Regex:</strong> <code>{escape(profile['pattern'])}</code>
+            | <strong>Compile:</strong> {profile['compile_ms']} ms
+            | <strong>Best of:</strong> {profile['repeats']} runs</div>
+        <table>
+            <tr><th>Size</th><th>Bytes</th><th>Matches</th><th>Match ms</th><th>MB/s</th></tr>
+            {rows}
+        </table>
+        {stopped}
+    </div>
+    '''
+
+def _render_match_item(index, start, end, match, groups):
+    """Render one match with its span and captured groups"""
+    groups_html = f' <code>{escape(groups)}</code>' if groups else ''
+    return (f'<div class="match-item">{index}. {escape(match)}{groups_html}'
+            f'<span class="match-span">[{start}:{end}]</span></div>')
+
+def _render_results(test_string, regex_pattern, page):
+    """Render the first page of match results, with the matches highlighted"""
+    fallback_html = ''
+    if page['fallback_reason']:
+        fallback_html = f" (the linear engine can't run this pattern: {escape(page['fallback_reason'])})"
+    engine_html = f"<strong>Engine:</strong> {ENGINES[page['engine']]}{fallback_html}"
+    if page['cached']:
+        engine_html += ' | <em>cached result</em>'
+    
+    if not page['matches']:
+        return f'''
         <div class="results">
             <div class="match-count">No matches found</div>
+            <div>{engine_html}</div>
         </div>
         '''
     
     matches_html = '\n'.join([
-        f'<div class="match-item">{i+1}. {match}</div>' 
-        for i, match in enumerate(matches)
+        _render_match_item(i + 1, start, end, match, groups)
+        for i, (start, end, match, groups) in enumerate(page['matches'])
     ])
     
+    if page['count_capped']:
+        count_text = f"about {page['count_estimate']} (counted the first {page['count']})"
+    else:
+        count_text = str(page['count'])
+    
+    spans = [(start, end) for start, end, _, _ in page['matches']]
+    highlighted = highlight(test_string, spans, app.config['REGEX_DISPLAY_CHARS'])
+    
+    more_html = ''
+    if page['cursor']:
+        more_html = f'''
+        <button type="button" id="load-more" data-cursor="{page['cursor']}">Load more matches</button>
+        <script>
+            document.getElementById('load-more').addEventListener('click', async function () {{
+                const button = this;
+                const response = await fetch('{url_for('more_matches')}?cursor=' + encodeURIComponent(button.dataset.cursor));
+                const data = await response.json();
+                if (data.error) {{
+                    button.textContent = data.error;
+                    button.disabled = true;
+                    return;
+                }}
+                for (const m of data.matches) {{
+                    const item = document.createElement('div');
+                    item.className = 'match-item';
+                    item.textContent = m.index + '. ' + m.match + (m.groups.length ? ' ' + JSON.stringify(m.groups) : '');
+                    const span = document.createElement('span');
+                    span.className = 'match-span';
+                    span.textContent = '[' + m.start + ':' + m.end + ']';
+                    item.appendChild(span);
+                    document.getElementById('match-list').appendChild(item);
+                }}
+                if (data.next_cursor) {{
+                    button.dataset.cursor = data.next_cursor;
+                }} else {{
+                    button.remove();
+                }}
+            }});
+        </script>
+        '''
+    
     return f'''
     <div class="results">
-        <div class="match-count">Matches Found: {len(matches)}</div>
-        <div><strong>Test String:</strong> {test_string}</div>
-        <div style="margin-bottom: 15px;"><strong>Regex:</strong> <code>{regex_pattern}</code></div>
+        <div class="match-count">Matches Found: {count_text}</div>
+        <div style="margin-bottom: 15px;"><strong>Regex:</strong> <code>{escape(regex_pattern)}</code>
+            | {engine_html}</div>
+        <div style="margin-bottom: 15px;"><strong>Test String:</strong>
+            <div class="highlighted">{highlighted}</div>
+        </div>
+        <div id="match-list">
         {matches_html}
+        </div>
+        {more_html}
     </div>
     '''
 
@@ -0,0 +1,112 @@
+"""
+Cost profiling of a regex pattern against a sample text.
+
+Runs inside a worker process: times compilation, then times a full finditer
+pass over the text and over copies of it doubled in size, and fits how the
+run time grows with the input so super-linear patterns can be flagged.
+"""
+import math
+import time
+
+try:
+    import re._compiler as sre_compile
+except ImportError:  # Python < 3.11
+    import sre_compile
+
+# Runs faster than this are mostly timer noise and are left out of the fit
+MIN_FIT_SECONDS = 50e-6
+# Growth exponent above which a pattern is reported as super-linear
+SUPER_LINEAR_EXPONENT = 1.25
+
+
+def _best_time(fn, repeats):
+    """Fastest of `repeats` runs of fn(), plus its last return value"""
+    best = math.inf
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _count_matches(compiled, text):
+    count = 0
+    for _ in compiled.finditer(text):
+        count += 1
+    return count
+
+
+def fit_exponent(sizes, seconds):
+    """Least-squares slope of log(time) against log(size), e.g. 1.0 = linear"""
+    points = [(math.log(n), math.log(t)) for n, t in zip(sizes, seconds)
+              if n > 0 and t >= MIN_FIT_SECONDS]
+    if len(points) < 2:
+        return None
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return None
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+
+def profile_pattern(pattern, flags, text, repeats=3, doublings=5, max_bytes=4 << 20, budget=5.0):
+    """
+    Worker task: profile `pattern` over `text` and over copies doubled in size.
+    Stops doubling early once the next run would blow the time `budget`.
+    Returns a JSON-ready report.
+    """
+    started = time.perf_counter()
+
+    # sre_compile.compile skips re's cache, so every run really compiles
+    compile_seconds, compiled = _best_time(lambda: sre_compile.compile(pattern, flags), repeats)
+
+    base_bytes = len(text.encode('utf-8', 'surrogatepass'))
+    runs = []
+    stopped_early = False
+    scale = 1
+    for step in range(doublings + 1):
+        if step and base_bytes * scale > max_bytes:
+            break
+        sample = text * scale
+        seconds, matches = _best_time(lambda: _count_matches(compiled, sample), repeats)
+        size = base_bytes * scale
+        runs.append({
+            'scale': scale,
+            'bytes': size,
+            'match_ms': round(seconds * 1000, 4),
+            'matches': matches,
+            'mb_per_s': round(size / seconds / 1e6, 2) if seconds else None,
+        })
+        # Predict the next (doubled) run assuming the growth seen so far
+        exponent = fit_exponent([r['bytes'] for r in runs], [r['match_ms'] / 1000 for r in runs]) or 1.0
+        predicted = seconds * (2 ** max(1.0, exponent)) * repeats
+        if time.perf_counter() - started + predicted > budget:
+            stopped_early = step < doublings
+            break
+        scale *= 2
+
+    exponent = fit_exponent([r['bytes'] for r in runs], [r['match_ms'] / 1000 for r in runs])
+    ratios = [round(b['match_ms'] / a['match_ms'], 2) if a['match_ms'] else None
+              for a, b in zip(runs, runs[1:])]
+    super_linear = exponent is not None and exponent > SUPER_LINEAR_EXPONENT
+    if exponent is None:
+        verdict = 'too fast to measure growth, try a longer test string'
+    elif super_linear:
+        verdict = f'super-linear, time grows like n^{exponent:.2f}'
+    else:
+        verdict = f'linear, time grows like n^{exponent:.2f}'
+
+    return {
+        'compile_ms': round(compile_seconds * 1000, 4),
+        'input_bytes': base_bytes,
+        'repeats': repeats,
+        'runs': runs,
+        'doubling_ratios': ratios,
+        'growth_exponent': round(exponent, 3) if exponent is not None else None,
+        'super_linear': super_linear,
+        'verdict': verdict,
+        'stopped_early': stopped_early,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,98 @@
+"""
+Cache of match results, so resubmitting the same (pattern, text) pair is
+answered without scanning the text again.
+
+Entries are keyed by the pattern, flags, engine and a digest of the text, and
+stored serialized so their real size is known. The cache is bounded by the
+total bytes stored, not the number of entries, and results past a size
+threshold are kept zlib-compressed.
+"""
+import pickle
+import threading
+import zlib
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    LRU cache of match results, evicted by total size in bytes.
+    - Values are pickled on the way in, so callers get a fresh copy back
+    - Values bigger than `compress_threshold` bytes are compressed
+    - A value bigger than the whole cache is not stored
+    """
+
+    def __init__(self, max_bytes=32 << 20, compress_threshold=16 << 10, level=1):
+        self.max_bytes = max_bytes
+        self.compress_threshold = compress_threshold
+        self.level = level
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # key -> (compressed, data, raw size)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compressed_entries = 0
+        self.raw_bytes = 0  # size of stored values before compression
+
+    def get(self, key):
+        """Return a copy of the cached value, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Decompress and unpickle outside the lock
+        compressed, data, _ = entry
+        return pickle.loads(zlib.decompress(data) if compressed else data)
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used ones to make room"""
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        raw_size = len(data)
+        compressed = raw_size > self.compress_threshold
+        if compressed:
+            data = zlib.compress(data, self.level)
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (compressed, data, raw_size)
+            self.total_bytes += len(data)
+            self.raw_bytes += raw_size
+            self.compressed_entries += compressed
+            while self.total_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        compressed, data, raw_size = self._entries.pop(key)
+        self.total_bytes -= len(data)
+        self.raw_bytes -= raw_size
+        self.compressed_entries -= compressed
+
+    def clear(self):
+        """Drop every cached result (counters are kept)"""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+            self.raw_bytes = 0
+            self.compressed_entries = 0
+
+    def stats(self):
+        """Return cache counters as a dict"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'compressed_entries': self.compressed_entries,
+                'bytes': self.total_bytes,
+                'uncompressed_bytes': self.raw_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            }
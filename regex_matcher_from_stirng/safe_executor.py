@@ -0,0 +1,258 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+try:
+    import re._parser as sre_parse
+    import re._constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+
+import match_tasks
+
+
+class MatchTimeout(Exception):
+    """Raised when a match runs past its deadline (the worker is killed)"""
+
+
+class WorkerCrashed(Exception):
+    """Raised when a worker process dies while running a task"""
+
+
+# ---------------------------------------------------------------------------
+# Static screening
+# ---------------------------------------------------------------------------
+
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_POSSESSIVE = getattr(sre_constants, 'POSSESSIVE_REPEAT', None)
+
+
+def _children(op, av):
+    """Yield the sub-pattern lists nested in one parsed node"""
+    if op in _REPEATS or op == _POSSESSIVE:
+        yield av[2]
+    elif op == sre_constants.SUBPATTERN:
+        yield av[-1]
+    elif op == sre_constants.BRANCH:
+        yield from av[1]
+    elif op in (sre_constants.ASSERT, sre_constants.ASSERT_NOT):
+        yield av[1]
+    elif op == getattr(sre_constants, 'ATOMIC_GROUP', None):
+        yield av
+    elif op == sre_constants.GROUPREF_EXISTS:
+        yield av[1]
+        if av[2] is not None:
+            yield av[2]
+
+
+def _has_unbounded_repeat(items):
+    for op, av in items:
+        if op in _REPEATS and av[1] == sre_constants.MAXREPEAT:
+            return True
+        for child in _children(op, av):
+            if _has_unbounded_repeat(child):
+                return True
+    return False
+
+
+def _first_literals(items):
+    """Literal code points a branch can start with, or None if unknown"""
+    for op, av in items:
+        if op == sre_constants.LITERAL:
+            return {av}
+        if op == sre_constants.SUBPATTERN:
+            return _first_literals(av[-1])
+        if op == sre_constants.AT:
+            continue
+        return None
+    return set()
+
+
+def _overlapping_branches(items):
+    for op, av in items:
+        if op == sre_constants.BRANCH:
+            branches = av[1]
+            # The parser factors out shared prefixes, so (ab|a) becomes a(b|)
+            # and an empty branch means two alternatives overlapped
+            keys = [repr(list(b)) for b in branches]
+            if any(not b for b in branches) or len(set(keys)) < len(keys):
+                return True
+            firsts = [_first_literals(b) for b in branches]
+            known = [f for f in firsts if f]
+            for i, a in enumerate(known):
+                for b in known[i + 1:]:
+                    if a & b:
+                        return True
+        for child in _children(op, av):
+            if _overlapping_branches(child):
+                return True
+    return False
+
+
+def _screen(items):
+    for op, av in items:
+        if op in _REPEATS and av[1] == sre_constants.MAXREPEAT:
+            body = av[2]
+            if _has_unbounded_repeat(body):
+                return 'nested unbounded quantifiers, e.g. (a+)+'
+            if _overlapping_branches(body):
+                return 'repeated alternation with overlapping branches, e.g. (a|a)*'
+        for child in _children(op, av):
+            reason = _screen(child)
+            if reason:
+                return reason
+    return None
+
+
+def screen_pattern(pattern, flags=0):
+    """
+    Cheap static check for patterns that backtrack exponentially.
+    Returns a reason string, or None when the pattern looks safe.
+    It only catches the obvious shapes, the deadline is the real guard.
+    """
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except Exception:
+        # Invalid patterns are reported by the compiler, not here
+        return None
+    return _screen(list(parsed))
+
+
+# ---------------------------------------------------------------------------
+# Worker pool
+# ---------------------------------------------------------------------------
+
+def _worker_main(conn):
+    """Loop run by each worker process: receive (fn, args), send back result"""
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError):
+            break
+        if task is None:
+            break
+        fn, args = task
+        try:
+            result = ('ok', fn(*args))
+        except Exception as e:
+            result = ('error', e)
+        try:
+            conn.send(result)
+        except Exception as e:
+            conn.send(('error', WorkerCrashed(f'Unsendable result: {e}')))
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        # Pre-warm: the first task waits for the import, not a real request
+        self.conn.send((match_tasks.ping, ()))
+        self.warming = True
+
+    def kill(self):
+        try:
+            self.process.kill()
+            self.process.join(1)
+        finally:
+            self.conn.close()
+
+
+class WorkerPool:
+    """
+    Fixed-size pool of pre-warmed worker processes with hard deadlines.
+    - A task that runs past its deadline gets its worker killed and replaced
+    - Workers are started lazily, and again after a fork (e.g. gunicorn --preload)
+    """
+
+    def __init__(self, size=2, timeout=2.0, start_method='spawn'):
+        self.size = size
+        self.timeout = timeout
+        self._ctx = multiprocessing.get_context(start_method)
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.timeouts = 0
+        self.replaced = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Workers inherited from a parent process are not ours to use
+            self._idle = queue.Queue()
+            for _ in range(self.size):
+                self._idle.put(_Worker(self._ctx))
+            self._pid = os.getpid()
+
+    def _replace(self, worker):
+        worker.kill()
+        self.replaced += 1
+        self._idle.put(_Worker(self._ctx))
+
+    def run(self, fn, *args, timeout=None):
+        """Run fn(*args) in a worker, raising MatchTimeout after the deadline"""
+        self._ensure_started()
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        try:
+            worker = self._idle.get(timeout=timeout)
+        except queue.Empty:
+            self.timeouts += 1
+            raise MatchTimeout(f'No free worker within {timeout:g}s, server is busy')
+
+        try:
+            if worker.warming:
+                # Startup time of a new worker doesn't count against the request
+                if not worker.conn.poll(30):
+                    raise WorkerCrashed('Worker failed to start')
+                worker.conn.recv()
+                worker.warming = False
+                deadline = time.monotonic() + timeout
+            worker.conn.send((fn, args))
+            if not worker.conn.poll(max(0.0, deadline - time.monotonic())):
+                self.timeouts += 1
+                self._replace(worker)
+                raise MatchTimeout(f'Matching took longer than {timeout:g}s and was stopped')
+            status, value = worker.conn.recv()
+        except (EOFError, OSError, WorkerCrashed) as e:
+            self._replace(worker)
+            if isinstance(e, WorkerCrashed):
+                raise
+            raise WorkerCrashed('Worker process died while matching')
+        except MatchTimeout:
+            raise
+        except BaseException:
+            self._replace(worker)
+            raise
+
+        self._idle.put(worker)
+        if status == 'error':
+            raise value
+        return value
+
+    def shutdown(self):
+        """Stop every idle worker"""
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.kill()
+        self._pid = None
+
+    def stats(self):
+        return {
+            'size': self.size,
+            'timeout': self.timeout,
+            'idle': self._idle.qsize() if self._pid == os.getpid() else 0,
+            'timeouts': self.timeouts,
+            'replaced': self.replaced,
+        }
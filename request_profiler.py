@@ -0,0 +1,384 @@
+"""
+Opt-in profiling of individual requests, for any of the apps (WSGI middleware).
+
+Off unless PROFILE_REQUESTS=1 is set in the environment, and when off
+nothing is installed at all. When on, a request is profiled if
+- it carries a valid X-Profile-Token header (signed with PROFILE_SECRET,
+  see make_token() or `python request_profiler.py token`), or
+- it's picked at random, with probability PROFILE_SAMPLE_RATE (default 0)
+
+A profiled request is captured with cProfile or by sampling its thread's
+stack every PROFILE_INTERVAL seconds (PROFILE_MODE, or the X-Profile-Mode
+header), plus a tracemalloc snapshot of what it left allocated. Both are
+written as collapsed stacks ("a;b;c 42" lines, ready for flamegraph.pl or
+speedscope) to PROFILE_DIR. Only the PROFILE_KEEP slowest requests of the
+last PROFILE_MAX_AGE seconds are kept, older and faster ones are deleted.
+
+tracemalloc traces the whole process while it runs, so allocations by
+other requests served at the same time show up too.
+"""
+import cProfile
+import hashlib
+import heapq
+import hmac
+import itertools
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, defaultdict
+
+from werkzeug.wsgi import ClosingIterator
+
+MODES = ('cprofile', 'sample')
+# Recursion in the cProfile call graph is followed at most this deep
+_MAX_DEPTH = 64
+
+
+def _enabled(value):
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def make_token(secret, ttl=300):
+    """X-Profile-Token value valid for `ttl` seconds"""
+    expires = int(time.time()) + ttl
+    signature = hmac.new(secret.encode(), str(expires).encode(), hashlib.sha256).hexdigest()
+    return f'{expires}.{signature}'
+
+
+class RequestProfiler:
+    """
+    Profiles the requests it's asked to and keeps the slowest.
+    Use wrap() on each WSGI app, and profiles() / path() to show the results.
+    """
+
+    def __init__(self, directory, secret=None, sample_rate=0.0, mode='sample', interval=0.005,
+                 keep=20, max_age=3600, trace_memory=True, memory_frames=32):
+        if mode not in MODES:
+            raise ValueError(f'mode must be one of {", ".join(MODES)}')
+        self.directory = directory
+        self.secret = secret
+        self.sample_rate = sample_rate
+        self.mode = mode
+        self.interval = interval
+        self.keep = keep
+        self.max_age = max_age
+        self.trace_memory = trace_memory
+        self.memory_frames = memory_frames
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._slowest = []  # min-heap of (duration, seq, profile)
+        self._seq = itertools.count()
+        # cProfile can only profile one request at a time on newer Pythons,
+        # others fall back to sampling meanwhile
+        self._cprofile_lock = threading.Lock()
+        self._tracing = 0  # profiled requests tracing memory right now
+        self._started_tracing = False  # else someone else started tracemalloc, leave it on
+        self.profiled = 0
+
+    @classmethod
+    def from_environ(cls, environ=os.environ):
+        """Profiler configured from PROFILE_* variables, or None if it's off"""
+        if not _enabled(environ.get('PROFILE_REQUESTS', '')):
+            return None
+        return cls(
+            directory=environ.get('PROFILE_DIR') or os.path.join(tempfile.gettempdir(), 'request-profiles'),
+            secret=environ.get('PROFILE_SECRET') or None,
+            sample_rate=float(environ.get('PROFILE_SAMPLE_RATE', 0.0)),
+            mode=environ.get('PROFILE_MODE', 'sample'),
+            interval=float(environ.get('PROFILE_INTERVAL', 0.005)),
+            keep=int(environ.get('PROFILE_KEEP', 20)),
+            max_age=float(environ.get('PROFILE_MAX_AGE', 3600)),
+            trace_memory=_enabled(environ.get('PROFILE_TRACEMALLOC', '1')),
+        )
+
+    def authorized(self, token):
+        """True if `token` was signed with our secret and hasn't expired"""
+        if not self.secret or not token:
+            return False
+        expires, _, signature = token.partition('.')
+        # isdigit() alone accepts digits int() rejects, like '\xb2'
+        if not (expires.isascii() and expires.isdigit()) or int(expires) < time.time():
+            return False
+        expected = hmac.new(self.secret.encode(), expires.encode(), hashlib.sha256).hexdigest()
+        # Compared as bytes: compare_digest raises on non-ASCII str
+        return hmac.compare_digest(signature.encode('utf-8', 'surrogateescape'), expected.encode())
+
+    # Capturing
+
+    def wrap(self, name, wsgi_app):
+        """Middleware profiling `wsgi_app`'s requests, `name` labels them"""
+
+        def maybe_profiled(environ, start_response):
+            forced = self.authorized(environ.get('HTTP_X_PROFILE_TOKEN'))
+            if not forced and not (self.sample_rate and random.random() < self.sample_rate):
+                return wsgi_app(environ, start_response)
+            mode = environ.get('HTTP_X_PROFILE_MODE') if forced else None
+            return self._profile(name, wsgi_app, environ, start_response,
+                                 mode if mode in MODES else self.mode)
+
+        return maybe_profiled
+
+    def _profile(self, name, wsgi_app, environ, start_response, mode):
+        status = []
+
+        def recording_start_response(status_line, headers, exc_info=None):
+            status.append(status_line)
+            return start_response(status_line, headers, exc_info)
+
+        if mode == 'cprofile' and not self._cprofile_lock.acquire(blocking=False):
+            mode = 'sample'
+        if self.trace_memory:
+            self._start_tracing()
+        started = time.perf_counter()
+        started_at = time.time()
+        if mode == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+        else:
+            profiler = _StackSampler(threading.get_ident(), self.interval)
+            profiler.start()
+
+        def done():
+            # Runs once the response has been sent (or failed)
+            if mode == 'cprofile':
+                profiler.disable()
+            else:
+                profiler.stop()
+            duration = time.perf_counter() - started
+            snapshot = self._stop_tracing() if self.trace_memory else None
+            if mode == 'cprofile':
+                self._cprofile_lock.release()
+            self._record(name, environ, status[0] if status else '500', mode, started_at,
+                         duration, profiler, snapshot)
+
+        try:
+            response = wsgi_app(environ, recording_start_response)
+        except BaseException:
+            done()
+            raise
+        return ClosingIterator(response, done)
+
+    def _start_tracing(self):
+        with self._lock:
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(self.memory_frames)
+                self._started_tracing = True
+            self._tracing += 1
+            tracemalloc.reset_peak()
+
+    def _stop_tracing(self):
+        """Snapshot of what's allocated, stops tracing after the last request"""
+        with self._lock:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            self._tracing -= 1
+            if self._tracing == 0 and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<unknown>'),
+        ])
+        return snapshot, peak
+
+    # Results
+
+    def _record(self, name, environ, status, mode, started_at, duration, profiler, snapshot):
+        with self._lock:
+            self.profiled += 1
+            self._expire()
+            # Not among the slowest, don't bother writing it out
+            if len(self._slowest) >= self.keep and duration <= self._slowest[0][0]:
+                return
+        profile_id = uuid.uuid4().hex[:12]
+        prefix = os.path.join(self.directory, f'{time.strftime("%Y%m%d-%H%M%S", time.localtime(started_at))}'
+                                              f'-{name}-{profile_id}')
+        files = {}
+        if mode == 'cprofile':
+            stats = pstats.Stats(profiler)
+            files['pstats'] = prefix + '.pstats'
+            stats.dump_stats(files['pstats'])
+            stacks = _pstats_stacks(stats)
+        else:
+            stacks = profiler.stacks
+        files['stacks'] = prefix + '.folded'
+        _write_folded(files['stacks'], stacks)
+        top_allocations = []
+        peak_kb = None
+        if snapshot is not None:
+            snapshot, peak = snapshot
+            peak_kb = round(peak / 1024, 1)
+            files['memory'] = prefix + '.alloc.folded'
+            _write_folded(files['memory'], _memory_stacks(snapshot))
+            top_allocations = [
+                {'where': f'{stat.traceback[-1].filename}:{stat.traceback[-1].lineno}',
+                 'kb': round(stat.size / 1024, 1), 'count': stat.count}
+                for stat in snapshot.statistics('lineno')[:10]
+            ]
+
+        profile = {
+            'id': profile_id,
+            'app': name,
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', ''),
+            'query': environ.get('QUERY_STRING', ''),
+            'status': int(status[:3]),
+            'duration_ms': round(duration * 1000, 2),
+            'mode': mode,
+            'started_at': started_at,
+            'samples': sum(stacks.values()) if mode == 'sample' else None,
+            'peak_traced_kb': peak_kb,
+            'top_allocations': top_allocations,
+            'files': files,
+        }
+        with self._lock:
+            heapq.heappush(self._slowest, (duration, next(self._seq), profile))
+            while len(self._slowest) > self.keep:
+                _remove_files(heapq.heappop(self._slowest)[2])
+
+    def _expire(self):
+        """Drop profiles older than max_age (lock held)"""
+        cutoff = time.time() - self.max_age
+        expired = [entry for entry in self._slowest if entry[2]['started_at'] < cutoff]
+        if expired:
+            self._slowest = [entry for entry in self._slowest if entry[2]['started_at'] >= cutoff]
+            heapq.heapify(self._slowest)
+            for entry in expired:
+                _remove_files(entry[2])
+
+    def profiles(self):
+        """Kept profiles, slowest first"""
+        with self._lock:
+            self._expire()
+            return [profile for _, _, profile in sorted(self._slowest, key=lambda e: e[:2], reverse=True)]
+
+    def path(self, profile_id, kind):
+        """File of a kept profile ('stacks', 'memory' or 'pstats'), or None"""
+        with self._lock:
+            for _, _, profile in self._slowest:
+                if profile['id'] == profile_id:
+                    return profile['files'].get(kind)
+        return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'profiled': self.profiled,
+                'kept': len(self._slowest),
+                'keep': self.keep,
+                'sample_rate': self.sample_rate,
+                'mode': self.mode,
+                'tracing_memory': self._tracing > 0,
+            }
+
+
+class _StackSampler:
+    """Counts the stacks a thread is seen in, sampled from another thread"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code.co_filename, frame.f_code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+
+def _frame_label(filename, function):
+    return f'{os.path.basename(filename)}:{function}'
+
+
+def _pstats_stacks(stats):
+    """
+    Collapsed stacks (in microseconds) rebuilt from cProfile's call graph.
+    cProfile only records caller -> callee totals, so a function's time is
+    split between its callers in proportion to what each of them spent in
+    it. Close to the real stacks, exact where a function has one caller.
+    """
+    entries = stats.stats
+    callees = defaultdict(list)
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller, (_, _, _, edge_cumulative) in callers.items():
+            callees[caller].append((function, edge_cumulative))
+    stacks = Counter()
+
+    def label(function):
+        filename, _, name = function
+        return _frame_label(filename, name)
+
+    def walk(function, path, share, depth):
+        own_time, cumulative = entries[function][2], entries[function][3]
+        path = path + (label(function),)
+        microseconds = int(own_time * share * 1e6)
+        if microseconds:
+            stacks[';'.join(path)] += microseconds
+        if depth >= _MAX_DEPTH:
+            return
+        for callee, edge_cumulative in callees[function]:
+            callee_cumulative = entries[callee][3]
+            if callee == function or not callee_cumulative:
+                continue
+            callee_share = share * edge_cumulative / callee_cumulative
+            # Skip branches that couldn't add up to a microsecond
+            if callee_share * callee_cumulative >= 1e-6:
+                walk(callee, path, callee_share, depth + 1)
+
+    for function, (_, _, _, _, callers) in entries.items():
+        if not callers:
+            walk(function, (), 1.0, 0)
+    return stacks
+
+
+def _memory_stacks(snapshot):
+    """Collapsed stacks of the bytes still allocated, by allocation traceback"""
+    stacks = Counter()
+    for stat in snapshot.statistics('traceback'):
+        # Frames go from the oldest call to the allocation
+        path = ';'.join(f'{os.path.basename(frame.filename)}:{frame.lineno}' for frame in stat.traceback)
+        stacks[path] += stat.size
+    return stacks
+
+
+def _write_folded(path, stacks):
+    with open(path, 'w') as f:
+        for stack, value in sorted(stacks.items()):
+            f.write(f'{stack} {value}\n')
+
+
+def _remove_files(profile):
+    for path in profile['files'].values():
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == '__main__':
+    # python request_profiler.py token [ttl seconds]: print an X-Profile-Token
+    if sys.argv[1:2] != ['token'] or not os.environ.get('PROFILE_SECRET'):
+        sys.exit('usage: PROFILE_SECRET=... python request_profiler.py token [ttl]')
+    print(make_token(os.environ['PROFILE_SECRET'], int(sys.argv[2]) if len(sys.argv) > 2 else 300))
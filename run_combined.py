@@ -0,0 +1,19 @@
+"""
+Development server for combined_app.py: python run_combined.py
+
+combined_app is only imported inside main(). The regex app starts its worker
+processes with spawn, which re-imports the main module in every worker, and
+they would otherwise all load the five apps too. In production use a real
+server instead (see combined_app.py).
+"""
+
+
+def main():
+    from werkzeug.serving import run_simple
+
+    from combined_app import application
+    run_simple('127.0.0.1', 5000, application, use_reloader=True, threaded=True)
+
+
+if __name__ == '__main__':
+    main()